@@ -1,28 +1,152 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory
 from flask_cors import CORS
 import subprocess
 import tempfile
 import os
-import sys
 import io
 import contextlib
 import traceback
-import re
 import json
+import logging
+import random
+import importlib
+import multiprocessing
+import queue
+import threading
+import atexit
+import signal
+import gzip
+import hashlib
+import marshal
+import ast
+import tokenize
+import time
+import types
+import string
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 import markdown
 from datetime import datetime
+from book_files import BOOK_DIRS, chapter_files
+from search_index import SearchIndex
+from example_index import ExampleIndex
+from progress_store import ProgressStore, create_backend
+from exercise_repository import DEFAULT_HINT, ExerciseRepository
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，无法设置CPU和内存限制
+    resource = None
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只提供gzip压缩
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
+logger = logging.getLogger(__name__)
 
 # 配置
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'py', 'txt', 'md'}
 MAX_EXECUTION_TIME = 5  # 最大执行时间（秒）
+SANDBOX_WORKERS = int(os.environ.get('SANDBOX_WORKERS', os.cpu_count() or 2))  # 沙箱工作进程数
+MAX_CPU_TIME = MAX_EXECUTION_TIME  # 单次执行的CPU时间上限（秒）
+MAX_MEMORY_MB = int(os.environ.get('SANDBOX_MAX_MEMORY_MB', 256))  # 工作进程可额外使用的内存（MB）
+MAX_OUTPUT_SIZE = 64 * 1024  # 单次执行的最大输出字符数
+STREAM_CHUNK_SIZE = 4 * 1024  # 流式输出时每块的最大字符数
+BATCH_MAX_SUBMISSIONS = 500  # 批量评测一次最多提交的代码份数
+BATCH_MAX_TEST_CASES = 50  # 批量评测一次最多的测试用例数
+MAX_JOBS_PER_WORKER = 200  # 工作进程执行多少次后回收重建
+SANDBOX_ACQUIRE_TIMEOUT = 30  # 等待空闲工作进程的最长时间（秒），超时返回错误
+SPAWN_RETRY_DELAY = 0.5  # 创建工作进程失败后首次重试前等待的时间（秒），之后每次加倍
+SPAWN_RETRY_MAX_DELAY = 30  # 重试等待时间的上限（秒）
+SANDBOX_NICENESS = 10  # 沙箱进程降低的调度优先级，保证Web请求优先得到CPU
+# 执行方式：process 在沙箱进程池中执行（有超时和资源限制）；
+# thread 在请求线程内执行（无需fork，适合开发调试，但不能强制超时）
+SANDBOX_MODE = os.environ.get('SANDBOX_MODE', 'process')
+CODE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 编译缓存的容量（字节）
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', '0') == '1'  # 是否缓存确定性程序的输出
+RESULT_CACHE_TTL = 300  # 输出缓存的有效期（秒）
+RESULT_CACHE_MAX_ENTRIES = 1024  # 输出缓存的最大条目数
+ANALYSIS_CACHE_MAX_ENTRIES = 2048  # 代码分析结果缓存的最大条目数
+
+# 教材目录（仓库根目录下的三册书）
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BOOKS_ROOT = os.path.dirname(BASE_DIR)
+CHAPTER_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 章节渲染缓存的容量（字节）
+PAYLOAD_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 预压缩响应缓存的容量（字节）
+CACHE_FOLDER = os.path.join(BASE_DIR, '.cache')  # 持久化索引的存放目录
+SEARCH_INDEX_PATH = os.path.join(CACHE_FOLDER, 'search.idx')
+SEARCH_REFRESH_INTERVAL = 30  # 检查章节文件是否修改的间隔（秒）
+SEARCH_MAX_RESULTS = 50  # 单次检索最多返回的结果数
+EXAMPLE_INDEX_PATH = os.path.join(CACHE_FOLDER, 'examples.json')
+EXAMPLES_MAX_PER_PAGE = 100  # 代码示例分页的每页上限
+PROGRESS_BACKEND = os.environ.get('PROGRESS_BACKEND', 'sqlite')  # 学习进度存储后端：sqlite 或 memory
+PROGRESS_DB_PATH = os.environ.get('PROGRESS_DB_PATH', os.path.join(BASE_DIR, 'data', 'progress.db'))
+PROGRESS_FLUSH_INTERVAL = 1.0  # 学习进度批量写入的间隔（秒）
+PROGRESS_MAX_BYTES = 16 * 1024  # 单个用户进度数据的大小上限（字节）
+DEFAULT_PROGRESS = {
+    'completed_chapters': [],
+    'total_chapters': 18,
+    'current_chapter': 1,
+    'exercises_completed': 0,
+    'total_exercises': 72
+}
 
 # 确保上传目录存在
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+class OutputLimitExceeded(Exception):
+    """程序输出超过上限"""
+
+class LimitedStringIO(io.StringIO):
+    """有长度上限的输出缓冲区"""
+    
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.size = 0
+    
+    def write(self, text):
+        self.size += len(text)
+        if self.size > self.limit:
+            raise OutputLimitExceeded(f"输出超过{self.limit}个字符的限制")
+        return super().write(text)
+
+class StreamingOutput(LimitedStringIO):
+    """边执行边发送的输出缓冲区，只保留尚未发送的部分
+    
+    遇到换行或积累到STREAM_CHUNK_SIZE个字符时发送一块，
+    避免逐个字符发送，也不在内存中保留完整输出。
+    """
+    
+    def __init__(self, limit, send_chunk):
+        super().__init__(limit)
+        self.send_chunk = send_chunk
+        self.pending = []
+        self.pending_size = 0
+    
+    def write(self, text):
+        self.size += len(text)
+        if self.size > self.limit:
+            raise OutputLimitExceeded(f"输出超过{self.limit}个字符的限制")
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if '\n' in text or self.pending_size >= STREAM_CHUNK_SIZE:
+            self.flush()
+        return len(text)
+    
+    def flush(self):
+        if self.pending:
+            self.send_chunk(''.join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+    
+    def getvalue(self):
+        return ''
+
 class CodeExecutor:
     """安全的Python代码执行器"""
     
@@ -37,56 +161,329 @@ class CodeExecutor:
         'collections', 'itertools', 'functools', 'operator'
     ]
     
+    # 禁止调用或引用的内置名称
+    FORBIDDEN_NAMES = {
+        'open', 'file', 'exec', 'eval', 'compile', '__import__',
+        'raw_input', 'globals', 'locals', 'vars', '__builtins__'
+    }
+    
+    # 可以借助它们逃逸出沙箱的属性；双下划线属性另外一律禁止（见is_forbidden_attribute）
+    FORBIDDEN_ATTRIBUTES = {
+        'mro', 'f_globals', 'f_locals', 'f_builtins', 'f_back', 'f_code',
+        'gi_frame', 'gi_code', 'cr_frame', 'cr_code', 'ag_frame', 'tb_frame', 'tb_next',
+        # 按名字取属性或调用方法，会绕过safe_getattr
+        'attrgetter', 'methodcaller', 'get_field',
+        # 危险的函数，不论通过哪个对象访问（re.compile无害，不在其中）
+        'open', 'file', 'exec', 'eval', 'raw_input', 'globals', 'locals', 'vars',
+        # 白名单中的模块会引用其他模块（如json.codecs、datetime.sys），不允许通过属性访问
+        'builtins', 'sys', 'os', 'posix', 'nt', 'codecs', 'io', 'subprocess', 'shutil',
+        'glob', 'importlib', 'pickle', 'copyreg', 'ctypes', 'gc', 'inspect'
+    }
+    
+    # 允许访问的双下划线属性
+    ALLOWED_DUNDER_ATTRIBUTES = {'__name__', '__doc__'}
+    
+    @staticmethod
+    def is_forbidden_attribute(name):
+        """是否禁止访问该属性：双下划线属性除少数无害的以外都不允许访问，
+        以单下划线开头的属性（如namedtuple._asdict）不受限制"""
+        if name.startswith('__') and name.endswith('__'):
+            return name not in CodeExecutor.ALLOWED_DUNDER_ATTRIBUTES
+        return name in CodeExecutor.FORBIDDEN_ATTRIBUTES
+    
+    @staticmethod
+    def is_allowed_module(module):
+        """模块是否属于允许导入的白名单（包括其子模块，如json.decoder）"""
+        return module.__name__.split('.')[0] in CodeExecutor.ALLOWED_IMPORTS
+    
     @staticmethod
-    def check_code_safety(code):
+    def format_fields(text):
+        """返回格式字符串中的全部替换字段（包括格式说明中嵌套的字段），不是合法的格式字符串时返回空列表"""
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError:
+            return []
+        fields = []
+        for _, field, spec, _ in parsed:
+            if field:
+                fields.append(field)
+            if spec and '{' in spec:
+                fields.extend(CodeExecutor.format_fields(spec))
+        return fields
+    
+    @staticmethod
+    def check_code_safety(code, tree=None):
         """检查代码安全性"""
-        # 检查禁用的导入
-        for forbidden in CodeExecutor.FORBIDDEN_IMPORTS:
-            if f'import {forbidden}' in code or f'from {forbidden}' in code:
-                return False, f"不允许导入模块: {forbidden}"
-        
-        # 检查危险函数调用
-        dangerous_patterns = [
-            r'open\s*\(',
-            r'file\s*\(',
-            r'exec\s*\(',
-            r'eval\s*\(',
-            r'__import__',
-            r'input\s*\(',
-            r'raw_input\s*\('
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, code):
-                return False, f"包含不安全的操作: {pattern}"
-        
-        return True, "代码安全检查通过"
-    
-    @staticmethod
-    def execute_code(code, input_data=""):
-        """安全执行Python代码"""
-        is_safe, message = CodeExecutor.check_code_safety(code)
+        if tree is None:
+            try:
+                tree = ast.parse(code, '<string>')
+            except (SyntaxError, ValueError) as e:
+                return False, f"语法错误: {str(e)}"
+        is_safe, message, _ = CodeExecutor.inspect_tree(tree)
+        return is_safe, message
+    
+    @staticmethod
+    def inspect_tree(tree):
+        """单次遍历AST，同时完成安全检查和确定性判断
+        
+        返回 (是否安全, 说明, 是否确定性程序)。
+        """
+        deterministic = True
+        
+        # 用显式栈代替ast.walk，大段代码时快一倍左右
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            
+            if node_type is ast.Name:
+                if node.id in CodeExecutor.FORBIDDEN_NAMES:
+                    return False, f"包含不安全的操作: {node.id}", False
+                if node.id in CodeExecutor.NONDETERMINISTIC_MODULES:
+                    deterministic = False
+                continue
+            
+            if node_type is ast.Attribute:
+                if CodeExecutor.is_forbidden_attribute(node.attr):
+                    return False, f"不允许访问属性: {node.attr}", False
+            
+            elif node_type is ast.Import or node_type is ast.ImportFrom:
+                if node_type is ast.Import:
+                    modules = [alias.name for alias in node.names]
+                elif node.level:
+                    return False, "不允许使用相对导入", False
+                else:
+                    modules = [node.module or '']
+                    for alias in node.names:
+                        if alias.name != '*' and CodeExecutor.is_forbidden_attribute(alias.name):
+                            return False, f"不允许导入: {alias.name}", False
+                for module in modules:
+                    root = module.split('.')[0]
+                    if root in CodeExecutor.FORBIDDEN_IMPORTS:
+                        return False, f"不允许导入模块: {module}", False
+                    if root not in CodeExecutor.ALLOWED_IMPORTS:
+                        allowed = ', '.join(CodeExecutor.ALLOWED_IMPORTS)
+                        return False, f"不允许导入模块: {module}（只能导入 {allowed}）", False
+                    if root in CodeExecutor.NONDETERMINISTIC_MODULES:
+                        deterministic = False
+                continue
+            
+            elif node_type is ast.Constant:
+                # str.format按替换字段取属性时不经过safe_getattr，字符串中的其他内容不检查
+                if type(node.value) is str and '{' in node.value:
+                    for field in CodeExecutor.format_fields(node.value):
+                        for attr in field.replace('[', '.').split('.')[1:]:
+                            if CodeExecutor.is_forbidden_attribute(attr):
+                                return False, f"不允许访问属性: {attr}", False
+                continue
+            
+            for field in node._fields:
+                child = getattr(node, field, None)
+                if type(child) is list:
+                    stack.extend(item for item in child if isinstance(item, ast.AST))
+                elif isinstance(child, ast.AST):
+                    stack.append(child)
+        
+        return True, "代码安全检查通过", deterministic
+    
+    # 沙箱中预先加载的模块（工作进程启动时导入一次）
+    SANDBOX_MODULES = ['math', 'random', 'datetime', 'json', 'string', 're']
+    
+    # 使用这些模块的程序每次运行的输出可能不同，不缓存其结果
+    NONDETERMINISTIC_MODULES = {'random', 'datetime'}
+    
+    @staticmethod
+    def make_import(copies):
+        """生成沙箱中的__import__：只允许导入白名单中的模块，返回本次执行自己的沙箱版本"""
+        def safe_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level != 0 or name.split('.')[0] not in CodeExecutor.ALLOWED_IMPORTS:
+                raise ImportError(f"不允许导入模块: {name}")
+            return CodeExecutor.sandbox_module(__import__(name, globals, locals, fromlist, level), copies)
+        return safe_import
+    
+    @staticmethod
+    def safe_getattr(obj, name, *default):
+        """沙箱中的getattr，拒绝危险属性和白名单以外的模块"""
+        if isinstance(name, str) and CodeExecutor.is_forbidden_attribute(name):
+            raise AttributeError(f"不允许访问属性: {name}")
+        value = getattr(obj, name, *default)
+        if isinstance(value, types.ModuleType) and not CodeExecutor.is_allowed_module(value):
+            raise AttributeError(f"不允许访问模块: {value.__name__}")
+        return value
+    
+    @staticmethod
+    def safe_hasattr(obj, name):
+        """沙箱中的hasattr，拒绝危险属性"""
+        if isinstance(name, str) and CodeExecutor.is_forbidden_attribute(name):
+            raise AttributeError(f"不允许访问属性: {name}")
+        return hasattr(obj, name)
+    
+    @staticmethod
+    def safe_setattr(obj, name, value):
+        """沙箱中的setattr，拒绝危险属性，也不允许修改模块"""
+        if isinstance(name, str) and CodeExecutor.is_forbidden_attribute(name):
+            raise AttributeError(f"不允许访问属性: {name}")
+        if isinstance(obj, types.ModuleType):
+            raise AttributeError(f"不允许修改模块的属性: {name}")
+        setattr(obj, name, value)
+    
+    # 模块名 -> (公开的非模块属性, {属性名: 白名单中的子模块})，每个模块只筛选一次
+    _module_attributes = {}
+    
+    @staticmethod
+    def public_attributes(module):
+        """筛选模块的公开属性：白名单中的子模块单独列出，其他模块（如json.codecs）去掉"""
+        attributes = CodeExecutor._module_attributes.get(module.__name__)
+        if attributes is None:
+            values = {}
+            submodules = {}
+            for name, value in vars(module).items():
+                if name.startswith('_'):
+                    continue
+                if isinstance(value, types.ModuleType):
+                    if CodeExecutor.is_allowed_module(value):
+                        submodules[name] = value
+                    continue
+                values[name] = value
+            attributes = CodeExecutor._module_attributes[module.__name__] = (values, submodules)
+        return attributes
+    
+    @staticmethod
+    def sandbox_module(module, copies):
+        """生成模块的沙箱版本：只包含公开属性，其中引用的白名单以外的模块（如json.codecs）不放入
+        
+        copies为 {模块名: 沙箱版本}，每次执行使用新的copies，学生代码修改模块属性
+        （如math.sqrt = ...）只影响本次执行，不会留给同一工作进程中的后续任务。
+        属性在第一次访问时才复制进来（模块的__getattr__），执行前不需要复制整个模块。
+        """
+        copy = copies.get(module.__name__)
+        if copy is not None:
+            return copy
+        copy = copies[module.__name__] = types.ModuleType(module.__name__, module.__doc__)
+        values, submodules = CodeExecutor.public_attributes(module)
+        namespace = vars(copy)
+        
+        def load_attribute(name):
+            if name in values:
+                value = values[name]
+            elif name in submodules:
+                value = CodeExecutor.sandbox_module(submodules[name], copies)
+            else:
+                raise AttributeError(f"module '{module.__name__}' has no attribute '{name}'")
+            namespace[name] = value
+            return value
+        
+        namespace['__getattr__'] = load_attribute
+        return copy
+    
+    @staticmethod
+    def load_sandbox_modules():
+        """导入沙箱可用的模块（每次执行时再生成各自的沙箱版本）"""
+        return {name: importlib.import_module(name) for name in CodeExecutor.SANDBOX_MODULES}
+    
+    @staticmethod
+    def compile_code(code):
+        """安全检查并编译代码，返回可以直接发送给工作进程的字节码"""
+        try:
+            tree = ast.parse(code, '<string>')
+            compiled = compile(tree, '<string>', 'exec')
+            is_safe, message, deterministic = CodeExecutor.inspect_tree(tree)
+            bytecode = marshal.dumps(compiled) if is_safe else None
+        except (SyntaxError, ValueError) as e:
+            error = ''.join(traceback.format_exception_only(type(e), e))
+            return {'ok': False, 'message': f"执行错误: {str(e)}\n{error}", 'bytecode': None, 'pure': False}
+        except (RecursionError, MemoryError):
+            # 极深的嵌套或超长的表达式会让解析器递归过深或耗尽内存，
+            # 同样作为编译失败返回，由调用方缓存，重复提交时不再解析
+            return {'ok': False, 'message': "执行错误: 代码嵌套过深或表达式过长，无法编译", 'bytecode': None, 'pure': False}
+        
         if not is_safe:
-            return False, message, ""
+            return {'ok': False, 'message': message, 'bytecode': None, 'pure': False}
+        return {
+            'ok': True,
+            'message': message,
+            'bytecode': bytecode,
+            'pure': deterministic
+        }
+    
+    @staticmethod
+    def execute_code(code, input_data="", use_result_cache=False, echo_prompts=True):
+        """安全执行Python代码
+        
+        use_result_cache为True时，确定性程序在相同输入下的输出会被缓存，
+        再次提交时直接返回缓存结果而不执行。
+        echo_prompts为False时input()的提示文字不写入输出（评测测试用例时使用）。
+        """
+        compiled = code_cache.get(code)
+        if not compiled['ok']:
+            return False, compiled['message'], ""
+        
+        cacheable = use_result_cache and echo_prompts and compiled['pure']
+        if cacheable:
+            cached_output = result_cache.get(code, input_data)
+            if cached_output is not None:
+                return True, "执行成功", cached_output
+        
+        if SANDBOX_MODE == 'thread':
+            result = CodeExecutor.run_sandboxed(
+                marshal.loads(compiled['bytecode']), input_data, echo_prompts=echo_prompts
+            )
+        else:
+            result = sandbox_pool.run({
+                'bytecode': compiled['bytecode'],
+                'input': input_data,
+                'echo_prompts': echo_prompts
+            })
+        if result['status'] == 'ok':
+            if cacheable:
+                result_cache.put(code, input_data, result['stdout'])
+            return True, "执行成功", result['stdout']
+        return False, result['message'], result['stderr']
+    
+    @staticmethod
+    def stream_code(code, input_data=""):
+        """安全执行Python代码，依次产出输出块和最终结果（流式输出）"""
+        compiled = code_cache.get(code)
+        if not compiled['ok']:
+            yield {'status': 'error', 'message': compiled['message'], 'stdout': '', 'stderr': ''}
+            return
         
-        # 重定向标准输出
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        old_stdin = sys.stdin
+        if SANDBOX_MODE == 'thread':
+            # 线程模式下没有管道，执行结束后一次性产出
+            result = CodeExecutor.run_sandboxed(marshal.loads(compiled['bytecode']), input_data)
+            if result['stdout']:
+                yield {'status': 'chunk', 'data': result['stdout']}
+            yield result
+            return
         
-        stdout_capture = io.StringIO()
-        stderr_capture = io.StringIO()
+        yield from sandbox_pool.stream({
+            'bytecode': compiled['bytecode'],
+            'input': input_data,
+            'stream': True
+        })
+    
+    @staticmethod
+    def run_sandboxed(code, input_data="", modules=None, send_chunk=None, echo_prompts=True):
+        """在当前进程中执行代码（源码或已编译的代码对象），返回包含stdout、stderr和状态的结果
+        
+        输入输出通过沙箱内的print和input传递给本次执行自己的缓冲区，
+        不替换全局的sys.stdout，多个线程可以同时执行。
+        提供send_chunk时输出边执行边发送，结果中的stdout为空。
+        """
+        if send_chunk is None:
+            stdout_capture = LimitedStringIO(MAX_OUTPUT_SIZE)
+        else:
+            stdout_capture = StreamingOutput(MAX_OUTPUT_SIZE, send_chunk)
+        stderr_capture = LimitedStringIO(MAX_OUTPUT_SIZE)
         stdin_input = io.StringIO(input_data)
         
+        copies = {}
         try:
-            sys.stdout = stdout_capture
-            sys.stderr = stderr_capture
-            sys.stdin = stdin_input
-            
             # 创建受限的全局环境
             safe_globals = {
                 '__builtins__': {
-                    'print': print,
+                    'print': CodeExecutor.make_print(stdout_capture),
+                    'input': CodeExecutor.make_input(stdin_input, stdout_capture if echo_prompts else None),
                     'len': len,
                     'str': str,
                     'int': int,
@@ -109,44 +506,641 @@ class CodeExecutor:
                     'round': round,
                     'type': type,
                     'isinstance': isinstance,
-                    'hasattr': hasattr,
-                    'getattr': getattr,
-                    'setattr': setattr,
+                    'hasattr': CodeExecutor.safe_hasattr,
+                    'getattr': CodeExecutor.safe_getattr,
+                    'setattr': CodeExecutor.safe_setattr,
+                    '__import__': CodeExecutor.make_import(copies),
                     'ValueError': ValueError,
                     'TypeError': TypeError,
                     'IndexError': IndexError,
                     'KeyError': KeyError,
+                    'EOFError': EOFError,
                 }
             }
             
-            # 添加允许的模块
-            import math
-            import random
-            import datetime
-            import json as json_module
-            import string
-            import re as re_module
-            
-            safe_globals['math'] = math
-            safe_globals['random'] = random
-            safe_globals['datetime'] = datetime
-            safe_globals['json'] = json_module
-            safe_globals['string'] = string
-            safe_globals['re'] = re_module
+            # 添加允许的模块（本次执行专用的沙箱版本）
+            for name, module in (modules or CodeExecutor.load_sandbox_modules()).items():
+                safe_globals[name] = CodeExecutor.sandbox_module(module, copies)
             
             # 执行代码
             exec(code, safe_globals)
+            stdout_capture.flush()
             
-            return True, "执行成功", stdout_capture.getvalue()
+            return {
+                'status': 'ok',
+                'message': "执行成功",
+                'stdout': stdout_capture.getvalue(),
+                'stderr': stderr_capture.getvalue()
+            }
             
         except Exception as e:
-            error_msg = f"执行错误: {str(e)}\n{traceback.format_exc()}"
-            return False, error_msg, stderr_capture.getvalue()
+            stdout_capture.flush()
+            return {
+                'status': 'error',
+                'message': f"执行错误: {str(e)}\n{traceback.format_exc()}",
+                'stdout': stdout_capture.getvalue(),
+                'stderr': stderr_capture.getvalue(),
+                # 内存耗尽后进程状态不可靠，需要回收
+                'recycle': isinstance(e, MemoryError)
+            }
+    
+    @staticmethod
+    def make_print(stdout):
+        """生成写入指定缓冲区的print"""
+        def sandbox_print(*args, sep=' ', end='\n', file=None, flush=False):
+            print(*args, sep=sep, end=end, file=stdout if file is None else file, flush=flush)
+        return sandbox_print
+    
+    @staticmethod
+    def make_input(stdin, stdout):
+        """生成从指定缓冲区读取一行的input，提示文字写入输出（stdout为None时丢弃）"""
+        def sandbox_input(prompt=''):
+            if prompt and stdout is not None:
+                stdout.write(str(prompt))
+            line = stdin.readline()
+            if not line:
+                raise EOFError("EOF when reading a line")
+            return line[:-1] if line.endswith('\n') else line
+        return sandbox_input
+
+class LRUCache:
+    """加锁的LRU缓存，超出容量时淘汰最久未使用的条目
+    
+    提供size_of时按条目大小之和（如字节数）计算容量，否则按条目数；
+    大小超过全部容量的条目不缓存。
+    """
+    
+    def __init__(self, capacity, size_of=None):
+        self.capacity = capacity
+        self.size_of = size_of
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _sizeof(self, value):
+        return self.size_of(value) if self.size_of is not None else 1
+    
+    def get(self, key, valid=None):
+        """返回缓存的值并标记为最近使用；没有缓存或valid(值)为False（已过期）时返回None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                if valid is None or valid(value):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self.size -= self._sizeof(self._entries.pop(key))
+            self.misses += 1
+            return None
+    
+    def put(self, key, value):
+        """放入或替换一个条目"""
+        size = self._sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= self._sizeof(old)
+            if size > self.capacity:
+                return
+            self._entries[key] = value
+            self.size += size
+            while self.size > self.capacity:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self._sizeof(evicted)
+    
+    def stats(self):
+        """条目数和命中统计"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+class CompiledCodeCache:
+    """以源码哈希为键的LRU缓存，保存安全检查结论和编译后的字节码
+    
+    学生反复运行同一段示例或练习模板时，直接复用缓存结果，
+    跳过正则扫描和compile。缓存按字节预算淘汰最久未使用的条目。
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = LRUCache(max_bytes, self._entry_size)
+    
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry['bytecode'] or b'') + len(entry['message']) + 128
+    
+    def get(self, code):
+        """返回代码的编译结果，未命中时编译并放入缓存"""
+        key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = CodeExecutor.compile_code(code)
+            self._entries.put(key, entry)
+        return entry
+    
+    def stats(self):
+        """缓存统计信息"""
+        return dict(self._entries.stats(), bytes=self._entries.size, max_bytes=self.max_bytes)
+
+code_cache = CompiledCodeCache(CODE_CACHE_MAX_BYTES)
+
+class ResultCache:
+    """确定性程序的输出缓存，按TTL过期并按LRU淘汰
+    
+    课堂演示时全班运行同一个示例，只需真正执行一次。
+    """
+    
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = LRUCache(max_entries)  # 键 -> (过期时间, 输出)
+    
+    @staticmethod
+    def _key(code, input_data):
+        digest = hashlib.sha256(code.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(input_data.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def get(self, code, input_data):
+        """返回缓存的输出，没有或已过期时返回None"""
+        entry = self._entries.get(self._key(code, input_data), lambda entry: entry[0] > time.monotonic())
+        return entry[1] if entry is not None else None
+    
+    def put(self, code, input_data, output):
+        """缓存一次成功执行的输出"""
+        self._entries.put(self._key(code, input_data), (time.monotonic() + self.ttl, output))
+    
+    def stats(self):
+        """缓存统计信息"""
+        return dict(self._entries.stats(), max_entries=self.max_entries, ttl=self.ttl)
+
+result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL)
+
+def _apply_memory_limit():
+    """限制工作进程的地址空间：在当前占用的基础上最多再使用MAX_MEMORY_MB"""
+    if resource is None or MAX_MEMORY_MB <= 0:
+        return
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return  # 无法得知当前占用时不设置限制，避免误杀进程
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current + MAX_MEMORY_MB * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _apply_cpu_budget():
+    """为下一次执行设置CPU时间上限，超出后进程会收到SIGXCPU被结束"""
+    if resource is None:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(usage.ru_utime + usage.ru_stime) + MAX_CPU_TIME + 1
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+def _sandbox_worker_main(conn):
+    """沙箱工作进程主循环：预先导入模块，通过管道接收任务并返回结果"""
+    modules = CodeExecutor.load_sandbox_modules()
+    _apply_memory_limit()
+    if hasattr(os, 'nice'):
+        os.nice(SANDBOX_NICENESS)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        _apply_cpu_budget()
+        code = marshal.loads(job['bytecode'])
+        send_chunk = None
+        if job.get('stream'):
+            send_chunk = lambda data: conn.send({'status': 'chunk', 'data': data})
+        conn.send(CodeExecutor.run_sandboxed(
+            code, job.get('input', ''), modules, send_chunk, job.get('echo_prompts', True)
+        ))
+    conn.close()
+
+class SandboxWorker:
+    """单个沙箱工作进程及其通信管道"""
+    
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        try:
+            self.process = context.Process(target=_sandbox_worker_main, args=(child_conn,), daemon=True)
+            self.process.start()
+        except BaseException:
+            self.conn.close()
+            raise
+        finally:
+            child_conn.close()
+        self.jobs = 0
+    
+    def kill(self):
+        """强制结束工作进程"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+    
+    def killed_by_cpu_limit(self):
+        """工作进程是否因为超出CPU时间被系统结束"""
+        self.process.join(1)
+        sigxcpu = getattr(signal, 'SIGXCPU', None)
+        return sigxcpu is not None and self.process.exitcode == -sigxcpu
+
+class SandboxWorkerPool:
+    """预先fork的沙箱工作进程池，多个学生的代码可以在多核上并行执行
+    
+    工作进程全部由一个专用的spawner线程创建和重建：fork不发生在多线程服务器的
+    请求线程中，也不会发生在异常处理过程中（否则子进程会继承当时的异常上下文）。
+    """
+    
+    _STOP = object()  # 通知spawner线程退出
+    
+    def __init__(self, size):
+        self.size = max(1, size)
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        self._idle = queue.Queue()
+        self._retired = queue.Queue()  # 等待spawner线程结束并替换的工作进程，None表示新建一个
+        self._workers = []
+        self._lock = threading.Lock()
+        self._started = False
+    
+    def start(self):
+        """启动spawner线程并创建全部工作进程（首次使用时自动调用）"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            spawner = threading.Thread(
+                target=self._spawn_loop, args=(self._retired,), name='sandbox-spawner', daemon=True
+            )
+            spawner.start()
+            for _ in range(self.size):
+                self._retired.put(None)
+    
+    def _spawn_loop(self, retired):
+        """spawner线程：依次结束被回收的工作进程，fork新的放入空闲队列"""
+        while True:
+            worker = retired.get()
+            if worker is SandboxWorkerPool._STOP:
+                return
+            if worker is not None:
+                worker.kill()
+            new_worker = self._spawn(retired)
+            if new_worker is None:
+                return
+            with self._lock:
+                if retired is not self._retired:
+                    # 进程池已关闭
+                    new_worker.kill()
+                    continue
+                if worker is not None:
+                    self._workers.remove(worker)
+                self._workers.append(new_worker)
+                self._idle.put(new_worker)
+    
+    def _spawn(self, retired):
+        """创建一个工作进程；fork失败（如EAGAIN、ENOMEM）时记录日志，等待后重试，
+        等待时间逐次加倍。重试期间进程池被关闭时返回None"""
+        delay = SPAWN_RETRY_DELAY
+        while True:
+            try:
+                return SandboxWorker(self._context)
+            except Exception:
+                logger.exception("创建沙箱工作进程失败，%.1f秒后重试", delay)
+            time.sleep(delay)
+            delay = min(delay * 2, SPAWN_RETRY_MAX_DELAY)
+            if retired is not self._retired:
+                return None
+    
+    def _replace(self, worker):
+        """把异常或到达执行次数上限的工作进程交给spawner线程结束并补充一个新的"""
+        self._retired.put(worker)
+    
+    def run(self, job):
+        """把任务交给一个空闲的工作进程执行，返回执行结果"""
+        result = None
+        # 读完整个生成器，让stream在正常流程中归还或回收工作进程
+        for message in self.stream(job):
+            if message['status'] != 'chunk':
+                result = message
+        return result
+    
+    def stream(self, job):
+        """把任务交给一个空闲的工作进程执行，依次产出输出块和最终结果
         
+        job['stream']为True时工作进程边执行边发送输出块（status为chunk），
+        最后一条消息是执行结果。调用方读得慢时管道写满，工作进程会在发送处阻塞。
+        超时、超出资源限制或执行次数达到上限的工作进程会被结束并重建，
+        其他工作进程不受影响；调用方中途放弃读取时也会重建该工作进程。
+        等待SANDBOX_ACQUIRE_TIMEOUT秒仍没有空闲的工作进程时（如无法fork新进程）返回错误结果。
+        """
+        self.start()
+        try:
+            worker = self._idle.get(timeout=SANDBOX_ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            yield {
+                'status': 'error',
+                'message': f"执行错误: {SANDBOX_ACQUIRE_TIMEOUT}秒内没有可用的沙箱进程，请稍后重试",
+                'stdout': '',
+                'stderr': ''
+            }
+            return
+        finished = False
+        result = {}
+        try:
+            deadline = time.monotonic() + MAX_EXECUTION_TIME
+            for message in self._dispatch(worker, job, deadline):
+                if message['status'] == 'chunk':
+                    yield message
+                else:
+                    result = message
+            finished = True
+            yield result
         finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
-            sys.stdin = old_stdin
+            worker.jobs += 1
+            if not finished or result.get('recycle') or worker.jobs >= MAX_JOBS_PER_WORKER:
+                self._replace(worker)
+            else:
+                self._idle.put(worker)
+    
+    def _dispatch(self, worker, job, deadline):
+        """发送任务并在截止时间前接收工作进程发回的全部消息"""
+        try:
+            worker.conn.send(job)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    break
+                message = worker.conn.recv()
+                yield message
+                if message['status'] != 'chunk':
+                    return
+            message = f"执行超时: 超过{MAX_EXECUTION_TIME}秒的时间限制"
+        except (EOFError, OSError):
+            if worker.killed_by_cpu_limit():
+                message = f"执行超时: 超过{MAX_CPU_TIME}秒的CPU时间限制"
+            else:
+                message = "执行错误: 沙箱进程异常退出"
+        yield {
+            'status': 'error',
+            'message': message,
+            'stdout': '',
+            'stderr': '',
+            'recycle': True
+        }
+    
+    def shutdown(self):
+        """停止spawner线程并关闭全部工作进程"""
+        with self._lock:
+            self._retired.put(SandboxWorkerPool._STOP)
+            for worker in self._workers:
+                worker.kill()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._retired = queue.Queue()
+            self._started = False
+
+sandbox_pool = SandboxWorkerPool(SANDBOX_WORKERS)
+atexit.register(sandbox_pool.shutdown)
+
+# 把执行任务分发到进程池的线程，每个线程同一时刻占用一个工作进程
+dispatch_executor = ThreadPoolExecutor(max_workers=sandbox_pool.size, thread_name_prefix='sandbox-dispatch')
+# 批量评测单独使用一组线程，最多同时占用一半的工作进程，交互式评测不会排在整批任务之后
+BATCH_WORKERS = max(1, sandbox_pool.size // 2)
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='sandbox-batch')
+
+class ChapterLibrary:
+    """章节文件索引和渲染缓存
+    
+    启动时扫描一次三册书的目录，建立章节号到文件的索引；
+    渲染后的HTML按字节预算做LRU缓存，文件修改时间变化时重新渲染。
+    """
+    
+    MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'toc']
+    
+    def __init__(self, root, book_dirs, max_bytes):
+        self.root = root
+        self.book_dirs = book_dirs
+        self.max_bytes = max_bytes
+        self.index = {}
+        self._cache = LRUCache(max_bytes, lambda entry: entry['size'])
+        self._sections = {}
+        self.build_index()
+    
+    def build_index(self):
+        """扫描教材目录，建立 章节号 -> 文件信息 的索引"""
+        index = {}
+        for item in chapter_files(self.root, self.book_dirs):
+            index[item['chapter_id']] = {
+                'path': os.path.join(self.root, item['path']),
+                'title': item['title'],
+                'book': item['path'].split(os.sep, 1)[0]
+            }
+        self.index = index
+        return index
+    
+    def version(self, chapter_id):
+        """章节文件的修改时间，用于判断缓存是否过期；章节不存在时返回None"""
+        info = self.index.get(chapter_id)
+        if info is None:
+            return None
+        try:
+            return os.stat(info['path']).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def get(self, chapter_id):
+        """返回渲染好的章节内容，章节不存在时返回None"""
+        info = self.index.get(chapter_id)
+        if info is None:
+            return None
+        try:
+            mtime = os.stat(info['path']).st_mtime_ns
+        except FileNotFoundError:
+            # 文件被移动或改名，重建索引后再试一次
+            self.build_index()
+            info = self.index.get(chapter_id)
+            if info is None:
+                return None
+            mtime = os.stat(info['path']).st_mtime_ns
+        
+        entry = self._cache.get(chapter_id, lambda entry: entry['mtime'] == mtime)
+        if entry is not None:
+            return entry['payload']
+        
+        with open(info['path'], encoding='utf-8') as f:
+            text = f.read()
+        payload = {
+            'title': info['title'],
+            'book': info['book'],
+            'content': markdown.markdown(text, extensions=self.MARKDOWN_EXTENSIONS),
+            'examples': [],
+            'exercises': []
+        }
+        self._cache.put(chapter_id, {'mtime': mtime, 'payload': payload, 'size': len(payload['content'].encode('utf-8'))})
+        return payload
+    
+    def sections(self, chapter_id):
+        """章节的目录：按二级标题（## ）划分的各节标题和在文件中的字节偏移
+        
+        只逐行扫描一遍文件，不解码整章内容；结果按文件修改时间缓存。
+        代码块中以 ## 开头的行不作为标题。
+        """
+        info = self.index.get(chapter_id)
+        mtime = self.version(chapter_id)
+        if mtime is None:
+            return None
+        cached = self._sections.get(chapter_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        sections = []
+        title = info['title']
+        start = 0
+        offset = 0
+        in_code = False
+        with open(info['path'], 'rb') as f:
+            for line in f:
+                if line.startswith(b'```'):
+                    in_code = not in_code
+                elif not in_code and line.startswith(b'## '):
+                    if offset > start:
+                        sections.append({'title': title, 'offset': start, 'length': offset - start})
+                    title = line[3:].decode('utf-8').strip()
+                    start = offset
+                elif not in_code and not sections and start == 0 and line.startswith(b'# '):
+                    # 第一个二级标题之前的部分以章节标题命名
+                    title = line[2:].decode('utf-8').strip()
+                offset += len(line)
+        if offset > start:
+            sections.append({'title': title, 'offset': start, 'length': offset - start})
+        for index, section in enumerate(sections):
+            section['index'] = index
+        
+        self._sections[chapter_id] = (mtime, sections)
+        return sections
+    
+    def get_section(self, chapter_id, index):
+        """按预先计算的字节偏移只读取并渲染一节，不存在时返回None"""
+        sections = self.sections(chapter_id)
+        if sections is None or not 0 <= index < len(sections):
+            return None
+        section = sections[index]
+        with open(self.index[chapter_id]['path'], 'rb') as f:
+            f.seek(section['offset'])
+            text = f.read(section['length']).decode('utf-8')
+        return {
+            'index': index,
+            'title': section['title'],
+            'content': markdown.markdown(text, extensions=self.MARKDOWN_EXTENSIONS)
+        }
+    
+    def stats(self):
+        """缓存统计信息"""
+        return {
+            'chapters': len(self.index),
+            'cached': self._cache.stats()['entries'],
+            'bytes': self._cache.size,
+            'max_bytes': self.max_bytes
+        }
+
+chapter_library = ChapterLibrary(BOOKS_ROOT, BOOK_DIRS, CHAPTER_CACHE_MAX_BYTES)
+search_index = SearchIndex(SEARCH_INDEX_PATH, BOOKS_ROOT, BOOK_DIRS)
+example_index = ExampleIndex(EXAMPLE_INDEX_PATH, BOOKS_ROOT, BOOK_DIRS)
+exercise_repository = ExerciseRepository(BOOKS_ROOT, BOOK_DIRS)
+progress_store = ProgressStore(
+    create_backend(PROGRESS_BACKEND, PROGRESS_DB_PATH), DEFAULT_PROGRESS, PROGRESS_FLUSH_INTERVAL
+)
+atexit.register(progress_store.close)
+_search_refresh_lock = threading.Lock()
+_search_checked_at = [0.0]
+
+def refresh_search_index():
+    """按间隔检查章节文件的修改时间，有变化时增量更新检索索引"""
+    now = time.monotonic()
+    if now - _search_checked_at[0] < SEARCH_REFRESH_INTERVAL:
+        return
+    with _search_refresh_lock:
+        if now - _search_checked_at[0] < SEARCH_REFRESH_INTERVAL:
+            return
+        if search_index.is_stale():
+            search_index.update()
+        _search_checked_at[0] = time.monotonic()
+
+class PayloadCache:
+    """静态接口的响应缓存
+    
+    每个响应只序列化一次JSON，同时保存gzip和brotli压缩后的版本以及内容哈希（用作ETag）。
+    version变化（例如章节文件被修改）时重新生成。
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = LRUCache(max_bytes, lambda entry: entry['size'])
+    
+    def get(self, key, version, build):
+        """返回缓存的响应；未命中时调用build()生成响应数据，build返回None表示不缓存"""
+        entry = self._entries.get(key, lambda entry: entry['version'] == version)
+        if entry is not None:
+            return entry
+        
+        payload = build()
+        if payload is None:
+            return None
+        body = app.json.dumps(payload).encode('utf-8')
+        entry = {
+            'version': version,
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=9),
+            # quality=11 只比9小约8%，但压缩耗时高一个数量级
+            'br': brotli.compress(body, quality=9) if brotli is not None else None
+        }
+        entry['size'] = len(body) + len(entry['gzip']) + len(entry['br'] or b'')
+        self._entries.put(key, entry)
+        return entry
+
+payload_cache = PayloadCache(PAYLOAD_CACHE_MAX_BYTES)
+
+def cached_json_response(key, version, build):
+    """返回带ETag、支持304和预压缩的JSON响应；build返回None时交给调用方处理"""
+    entry = payload_cache.get(key, version, build)
+    if entry is None:
+        return None
+    
+    # 不同压缩方式的响应体字节不同，强ETag必须不同：加上压缩方式作为后缀
+    coding = 'identity'
+    if entry['br'] is not None and request.accept_encodings['br']:
+        coding = 'br'
+    elif request.accept_encodings['gzip']:
+        coding = 'gzip'
+    etag = entry['etag'] if coding == 'identity' else f"{entry['etag']}-{coding}"
+    
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    return Response(entry[coding], mimetype='application/json', headers=headers)
 
 class ContentManager:
     """内容管理器"""
@@ -155,47 +1149,165 @@ class ContentManager:
     def load_chapter_content(chapter_id):
         """加载章节内容"""
         try:
-            file_path = f"第一册-Python基础与核心技术/第{chapter_id}章*.md"
-            # 这里应该实际读取markdown文件
-            # 为演示返回示例内容
-            return {
-                'title': f'第{chapter_id}章内容',
-                'content': f'这是第{chapter_id}章的内容...',
-                'examples': [],
-                'exercises': []
-            }
+            content = chapter_library.get(chapter_id)
+            if content is None:
+                return {'error': f'第{chapter_id}章不存在'}
+            return content
         except Exception as e:
             return {'error': str(e)}
     
     @staticmethod
     def get_exercise_by_id(exercise_id):
         """根据ID获取练习题"""
-        exercises_db = {
-            'chapter1_exercise1': {
-                'title': '个人信息输出程序',
-                'description': '编写一个程序，要求用户输入姓名、年龄和爱好，然后格式化输出个人信息。',
-                'difficulty': '基础',
-                'template': '''name = input("请输入您的姓名：")
-age = input("请输入您的年龄：")
-hobby = input("请输入您的爱好：")
-
-# TODO: 使用f-string格式化输出
-print(f"个人信息卡")
-# 请完成剩余代码...''',
-                'test_cases': [
-                    {'input': '张三\n20\n编程', 'expected_output': '个人信息卡\n==================\n姓名：张三\n年龄：20岁\n爱好：编程'}
-                ]
-            }
-        }
-        
-        return exercises_db.get(exercise_id, {})
+        exercise = exercise_repository.get(exercise_id)
+        return exercise.to_dict() if exercise else {}
 
 class AIAssistant:
     """AI助手，提供代码分析和建议"""
     
+    # 增加一条执行路径的语句（圈复杂度）
+    BRANCH_NODES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.Assert)
+    # 增加一层嵌套的复合语句
+    BLOCK_NODES = (
+        ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try,
+        ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef
+    )
+    FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+    # 单字母但约定俗成的名字
+    CONVENTIONAL_NAMES = {'_', 'i', 'j', 'k', 'n', 'x', 'y', 'e', 'f'}
+    MAX_COMPLEXITY = 10  # 单个函数的圈复杂度上限
+    MAX_NESTING_DEPTH = 4  # 最大嵌套层级
+    
     @staticmethod
     def analyze_code(code):
-        """分析代码质量"""
+        """分析代码质量（按源码哈希缓存）"""
+        return analysis_cache.get(code)
+    
+    @staticmethod
+    def measure_code(code):
+        """一次tokenize和一次AST遍历，统计注释、命名、圈复杂度、嵌套层级和print使用情况"""
+        metrics = {
+            'lines': 0,
+            'code_lines': 0,
+            'comment_lines': 0,
+            'comment_density': 0.0,
+            'identifiers': 0,
+            'poor_identifiers': [],
+            'identifier_quality': 1.0,
+            'complexity': 1,
+            'max_complexity': 1,
+            'complex_functions': [],
+            'max_nesting_depth': 0,
+            'print_calls': 0,
+            'syntax_error': None
+        }
+        
+        # 注释和代码行：只看token，不受字符串里的 # 影响
+        code_lines = set()
+        comment_lines = set()
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(code).readline):
+                if token.type == tokenize.COMMENT:
+                    comment_lines.add(token.start[0])
+                elif token.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.INDENT,
+                                        tokenize.DEDENT, tokenize.ENDMARKER):
+                    code_lines.update(range(token.start[0], token.end[0] + 1))
+        except (tokenize.TokenError, SyntaxError):
+            pass
+        metrics['lines'] = len(code_lines | comment_lines)
+        metrics['code_lines'] = len(code_lines)
+        metrics['comment_lines'] = len(comment_lines)
+        metrics['comment_density'] = round(len(comment_lines) / max(len(code_lines), 1), 3)
+        
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            # 源码中有NUL字节时没有行号
+            metrics['syntax_error'] = f"第{e.lineno}行: {e.msg}" if e.lineno else e.msg
+            return metrics
+        except ValueError as e:  # Python 3.12以前NUL字节抛出ValueError
+            metrics['syntax_error'] = str(e)
+            return metrics
+        except (RecursionError, MemoryError):
+            metrics['syntax_error'] = "代码嵌套过深或表达式过长"
+            return metrics
+        
+        identifiers = {}  # 名字 -> 是否为类名
+        loop_targets = set()
+        complexity = {None: 1}  # 所在函数 -> 圈复杂度，None表示模块级代码
+        max_depth = 0
+        
+        # 栈中保存 (节点, 嵌套层级, 所在函数)
+        stack = [(tree, 0, None)]
+        while stack:
+            node, depth, function = stack.pop()
+            node_type = type(node)
+            
+            if node_type is ast.Name:
+                if type(node.ctx) is ast.Store:
+                    identifiers.setdefault(node.id, False)
+                continue
+            if node_type is ast.arg:
+                identifiers.setdefault(node.arg, False)
+                continue
+            
+            if isinstance(node, AIAssistant.BRANCH_NODES):
+                complexity[function] += 1
+            elif node_type is ast.BoolOp:
+                complexity[function] += len(node.values) - 1
+            elif node_type is ast.comprehension:
+                complexity[function] += 1 + len(node.ifs)
+                if type(node.target) is ast.Name:
+                    loop_targets.add(node.target.id)
+            elif node_type is ast.Call:
+                if type(node.func) is ast.Name and node.func.id == 'print':
+                    metrics['print_calls'] += 1
+            
+            if node_type in (ast.For, ast.AsyncFor) and type(node.target) is ast.Name:
+                loop_targets.add(node.target.id)
+            
+            child_depth = depth
+            if isinstance(node, AIAssistant.BLOCK_NODES):
+                child_depth = depth + 1
+                max_depth = max(max_depth, child_depth)
+            if isinstance(node, AIAssistant.FUNCTION_NODES):
+                function = getattr(node, 'name', 'lambda') + f'（第{node.lineno}行）'
+                complexity[function] = 1
+                if node_type is not ast.Lambda:
+                    identifiers.setdefault(node.name, False)
+            elif node_type is ast.ClassDef:
+                identifiers[node.name] = True
+            
+            for child in ast.iter_child_nodes(node):
+                # elif 与 if 同级，不算多一层嵌套
+                if node_type is ast.If and node.orelse == [child] and type(child) is ast.If:
+                    stack.append((child, depth, function))
+                else:
+                    stack.append((child, child_depth, function))
+        
+        poor = []
+        for name, is_class in identifiers.items():
+            if len(name) == 1 and name not in AIAssistant.CONVENTIONAL_NAMES and name not in loop_targets:
+                poor.append(name)
+            elif not is_class and not name.isupper() and name != name.lower():
+                poor.append(name)  # 变量和函数应使用小写加下划线
+        
+        metrics['identifiers'] = len(identifiers)
+        metrics['poor_identifiers'] = sorted(poor)
+        metrics['identifier_quality'] = round(1 - len(poor) / max(len(identifiers), 1), 3)
+        metrics['complexity'] = sum(complexity.values()) - len(complexity) + 1
+        metrics['max_complexity'] = max(complexity.values())
+        metrics['complex_functions'] = sorted(
+            name for name, value in complexity.items()
+            if name is not None and value > AIAssistant.MAX_COMPLEXITY
+        )
+        metrics['max_nesting_depth'] = max_depth
+        return metrics
+    
+    @staticmethod
+    def build_analysis(code):
+        """根据统计指标给出评分和建议"""
+        metrics = AIAssistant.measure_code(code)
         suggestions = []
         score = 100
         
@@ -204,19 +1316,34 @@ class AIAssistant:
             suggestions.append("代码太短，建议添加更多功能")
             score -= 20
         
+        if metrics['syntax_error']:
+            suggestions.append(f"代码存在语法错误（{metrics['syntax_error']}），请先修正")
+            score -= 30
+        
         # 检查注释
-        comment_lines = [line for line in code.split('\n') if line.strip().startsWith('#')]
-        if len(comment_lines) == 0:
+        if metrics['comment_lines'] == 0:
             suggestions.append("建议添加注释来解释代码功能")
             score -= 10
+        elif metrics['code_lines'] >= 20 and metrics['comment_density'] < 0.05:
+            suggestions.append("注释偏少，建议为关键步骤补充说明")
+            score -= 5
         
         # 检查变量命名
-        if re.search(r'\b[a-z]\b', code):
-            suggestions.append("建议使用更有意义的变量名")
+        if metrics['poor_identifiers']:
+            names = '、'.join(metrics['poor_identifiers'][:5])
+            suggestions.append(f"建议使用更有意义的变量名（小写加下划线）：{names}")
+            score -= 5
+        
+        # 检查复杂度和嵌套
+        if metrics['complex_functions']:
+            suggestions.append(f"函数过于复杂，建议拆分：{'、'.join(metrics['complex_functions'][:3])}")
+            score -= 10
+        if metrics['max_nesting_depth'] > AIAssistant.MAX_NESTING_DEPTH:
+            suggestions.append(f"嵌套层级达到{metrics['max_nesting_depth']}层，可以用提前返回或拆分函数减少嵌套")
             score -= 5
         
         # 检查print语句
-        if 'print(' in code:
+        if metrics['print_calls']:
             suggestions.append("很好！使用了print语句进行输出")
         else:
             suggestions.append("考虑添加print语句来显示结果")
@@ -225,23 +1352,169 @@ class AIAssistant:
         return {
             'score': max(score, 0),
             'suggestions': suggestions,
-            'overall': '很好' if score >= 80 else '良好' if score >= 60 else '需要改进'
+            'overall': '很好' if score >= 80 else '良好' if score >= 60 else '需要改进',
+            'metrics': metrics
         }
     
     @staticmethod
     def get_hint(exercise_id):
         """获取练习提示"""
-        hints_db = {
-            'chapter1_exercise1': [
-                "使用f-string格式化字符串：f'文本{变量}'",
-                "记住使用input()函数获取用户输入",
-                "可以使用多个print()语句来格式化输出",
-                "注意输出格式要整齐美观"
-            ]
+        exercise = exercise_repository.get(exercise_id)
+        return random.choice(exercise.hints) if exercise else DEFAULT_HINT
+
+class AnalysisCache:
+    """以源码哈希为键的代码分析结果LRU缓存"""
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = LRUCache(max_entries)
+    
+    def get(self, code):
+        """返回代码的分析结果，未命中时分析并放入缓存"""
+        key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = AIAssistant.build_analysis(code)
+            self._entries.put(key, entry)
+        return entry
+    
+    def stats(self):
+        """缓存统计信息"""
+        return dict(self._entries.stats(), max_entries=self.max_entries)
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_MAX_ENTRIES)
+
+class CodeGrader:
+    """按测试用例评测学生代码"""
+    
+    @staticmethod
+    def normalize_output(text):
+        """去掉每行行尾空白和末尾空行，避免因多余空格判错"""
+        lines = [line.rstrip() for line in text.replace('\r\n', '\n').split('\n')]
+        while lines and not lines[-1]:
+            lines.pop()
+        return '\n'.join(lines)
+    
+    @staticmethod
+    def outputs_match(output, expected, exact=False):
+        """比较实际输出和期望输出，exact为False时忽略行尾空白和末尾空行"""
+        if exact:
+            return output == expected
+        return CodeGrader.normalize_output(output) == CodeGrader.normalize_output(expected)
+    
+    @staticmethod
+    def run_test_case(code, test_case, exact=False):
+        """用一个测试用例的输入执行代码并比较输出"""
+        started = time.perf_counter()
+        success, message, output = CodeExecutor.execute_code(
+            code, test_case.get('input', ''), echo_prompts=False
+        )
+        result = {
+            'success': success,
+            'output': output,
+            'passed': False,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+        if not success:
+            result['message'] = message
+        elif 'expected_output' in test_case:
+            result['passed'] = CodeGrader.outputs_match(output, test_case['expected_output'], exact)
+        else:
+            # 没有期望输出时，能正常运行即视为通过
+            result['passed'] = True
+        return result
+    
+    @staticmethod
+    def run_test_cases(code, test_cases, exact=False, stop_on_failure=False):
+        """并行执行全部测试用例，按用例顺序返回结果
+        
+        stop_on_failure为True时，第一个用例失败后不再等待其余用例，
+        尚未完成的用例标记为skipped。
+        """
+        futures = {
+            dispatch_executor.submit(CodeGrader.run_test_case, code, test_case, exact): index
+            for index, test_case in enumerate(test_cases)
         }
+        results = [None] * len(test_cases)
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                results[index]['case'] = index
+                if stop_on_failure and not results[index]['passed']:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
         
-        hints = hints_db.get(exercise_id, ["继续努力，你能做到的！"])
-        return random.choice(hints)
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {'case': index, 'success': False, 'output': '', 'passed': False, 'skipped': True}
+        return results
+    
+    @staticmethod
+    def grade_batch(submissions, test_cases, exact=False):
+        """把 N 份代码 × M 个测试用例分发到批量评测线程并行执行
+        
+        任务按顺序逐步提交，同一批最多有BATCH_WORKERS个任务在排队或执行，
+        多个批次同时评测时轮流得到工作进程。
+        每份代码的全部用例完成后立即产出该份代码的评测结果（按完成顺序）。
+        生成器被关闭时取消尚未开始的任务。
+        """
+        cases = test_cases or [{'input': ''}]
+        tasks = (
+            (index, case_index, submission['code'], test_case)
+            for index, submission in enumerate(submissions)
+            for case_index, test_case in enumerate(cases)
+        )
+        futures = {}
+        
+        def submit_next():
+            task = next(tasks, None)
+            if task is not None:
+                index, case_index, code, test_case = task
+                future = batch_executor.submit(CodeGrader.run_test_case, code, test_case, exact)
+                futures[future] = (index, case_index)
+        
+        case_results = [[None] * len(cases) for _ in submissions]
+        remaining = [len(cases)] * len(submissions)
+        try:
+            for _ in range(BATCH_WORKERS):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, case_index = futures.pop(future)
+                    submit_next()
+                    try:
+                        case_result = future.result()
+                    except Exception as e:
+                        case_result = {'success': False, 'output': '', 'passed': False, 'message': f'评测错误: {str(e)}'}
+                    case_result['case'] = case_index
+                    case_results[index][case_index] = case_result
+                    remaining[index] -= 1
+                    if remaining[index] == 0:
+                        yield CodeGrader._submission_result(index, submissions[index], case_results[index])
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    @staticmethod
+    def _submission_result(index, submission, case_results):
+        try:
+            analysis = AIAssistant.analyze_code(submission['code'])
+        except Exception as e:
+            analysis = {'error': f'代码分析失败: {str(e)}'}
+        return {
+            'type': 'result',
+            'index': index,
+            'id': submission.get('id', index),
+            'passed': all(case['passed'] for case in case_results),
+            'passed_cases': sum(1 for case in case_results if case['passed']),
+            'total_cases': len(case_results),
+            'test_results': case_results,
+            'analysis': analysis
+        }
 
 # 路由定义
 @app.route('/')
@@ -249,71 +1522,121 @@ def index():
     """主页"""
     return send_from_directory('.', 'index.html')
 
-@app.route('/api/run-python', methods=['POST'])
-def run_python():
-    """执行Python代码"""
+# 执行类接口的处理逻辑（Flask路由和asgi.py中的异步服务共用）
+
+def request_code(data):
+    """取出请求中的代码；只提供 example_id 时运行教材中对应的代码示例"""
+    code = data.get('code', '')
+    if not code and data.get('example_id'):
+        example = example_index.get(str(data['example_id']))
+        code = example['code'] if example else ''
+    return code
+
+def run_python_result(data):
+    """执行Python代码，返回响应数据"""
     try:
-        data = request.get_json()
-        code = data.get('code', '')
+        code = request_code(data)
         input_data = data.get('input', '')
         
         if not code.strip():
-            return jsonify({
+            return {
                 'success': False,
                 'error': '代码不能为空',
                 'output': ''
-            })
+            }
         
         # 执行代码
-        success, message, output = CodeExecutor.execute_code(code, input_data)
+        success, message, output = CodeExecutor.execute_code(
+            code, input_data, use_result_cache=RESULT_CACHE_ENABLED
+        )
         
-        return jsonify({
+        return {
             'success': success,
             'message': message,
             'output': output,
             'timestamp': datetime.now().isoformat()
-        })
+        }
         
     except Exception as e:
-        return jsonify({
+        return {
             'success': False,
             'error': f'服务器错误: {str(e)}',
             'output': ''
-        })
+        }
 
-@app.route('/api/evaluate-code', methods=['POST'])
-def evaluate_code():
-    """评估代码质量"""
+def run_python_events(data):
+    """执行Python代码，依次产出Server-Sent Events格式的输出"""
+    data = data or {}
+    code = request_code(data)
+    input_data = data.get('input', '')
+    
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    if not code.strip():
+        yield sse('done', {'success': False, 'error': '代码不能为空'})
+        return
+    for message in CodeExecutor.stream_code(code, input_data):
+        if message['status'] == 'chunk':
+            yield sse('output', {'data': message['data']})
+        else:
+            yield sse('done', {
+                'success': message['status'] == 'ok',
+                'message': "执行成功" if message['status'] == 'ok' else message['message'],
+                'timestamp': datetime.now().isoformat()
+            })
+
+def evaluate_code_result(data):
+    """评估代码质量，返回响应数据"""
     try:
-        data = request.get_json()
         code = data.get('code', '')
         exercise_id = data.get('exercise_id', '')
         
         if not code.strip():
-            return jsonify({
+            return {
                 'success': False,
                 'error': '代码不能为空'
-            })
-        
-        # 先执行代码检查是否能运行
-        success, message, output = CodeExecutor.execute_code(code)
+            }
         
-        # AI分析代码
-        analysis = AIAssistant.analyze_code(code)
+        exercise = ContentManager.get_exercise_by_id(exercise_id) if exercise_id else {}
+        test_cases = exercise.get('test_cases', [])
         
-        # 如果有练习ID，检查是否满足要求
         exercise_check = {}
-        if exercise_id:
-            exercise = ContentManager.get_exercise_by_id(exercise_id)
+        if test_cases:
+            # 用练习题的测试用例并行评测
+            test_results = CodeGrader.run_test_cases(
+                code, test_cases,
+                exact=bool(data.get('exact')),
+                stop_on_failure=bool(data.get('stop_on_failure'))
+            )
+            first_run = next(result for result in test_results if not result.get('skipped'))
+            success = first_run['success']
+            output = first_run['output']
+            message = first_run.get('message', '执行成功')
+            passed_cases = sum(1 for result in test_results if result['passed'])
+            passed = passed_cases == len(test_results)
+            exercise_check = {
+                'exercise_title': exercise.get('title', ''),
+                'passed': passed,
+                'passed_cases': passed_cases,
+                'total_cases': len(test_results),
+                'test_results': test_results,
+                'feedback': '全部测试用例通过' if passed else f'通过{passed_cases}/{len(test_results)}个测试用例'
+            }
+        else:
+            # 先执行代码检查是否能运行
+            success, message, output = CodeExecutor.execute_code(code)
             if exercise:
-                # 这里可以添加更复杂的测试逻辑
                 exercise_check = {
                     'exercise_title': exercise.get('title', ''),
                     'passed': success,
                     'feedback': '代码能够正常运行' if success else '代码执行出错'
                 }
         
-        return jsonify({
+        # AI分析代码
+        analysis = AIAssistant.analyze_code(code)
+        
+        return {
             'success': True,
             'execution': {
                 'success': success,
@@ -323,13 +1646,92 @@ def evaluate_code():
             'analysis': analysis,
             'exercise_check': exercise_check,
             'timestamp': datetime.now().isoformat()
-        })
+        }
         
     except Exception as e:
-        return jsonify({
+        return {
             'success': False,
             'error': f'评估错误: {str(e)}'
-        })
+        }
+
+def evaluate_batch_lines(data):
+    """批量评测，返回 (错误响应, None) 或 (None, 逐行产出NDJSON的生成器)"""
+    if not isinstance(data, dict):
+        return {'success': False, 'error': '请求格式错误'}, None
+    submissions = data.get('submissions', [])
+    test_cases = data.get('test_cases')
+    exercise_id = data.get('exercise_id', '')
+    
+    if test_cases is None and exercise_id:
+        test_cases = ContentManager.get_exercise_by_id(exercise_id).get('test_cases', [])
+    test_cases = test_cases or []
+    
+    if not isinstance(submissions, list) or not submissions:
+        return {'success': False, 'error': '没有需要评测的代码'}, None
+    if len(submissions) > BATCH_MAX_SUBMISSIONS:
+        return {'success': False, 'error': f'一次最多评测{BATCH_MAX_SUBMISSIONS}份代码'}, None
+    if not isinstance(test_cases, list):
+        return {'success': False, 'error': 'test_cases必须是测试用例的列表'}, None
+    if len(test_cases) > BATCH_MAX_TEST_CASES:
+        return {'success': False, 'error': f'一次最多使用{BATCH_MAX_TEST_CASES}个测试用例'}, None
+    
+    # 开始输出NDJSON之后无法再返回错误响应，先检查全部输入
+    for index, submission in enumerate(submissions):
+        if not isinstance(submission, dict):
+            return {'success': False, 'error': f'第{index + 1}份代码格式错误: 每份代码应为包含code的对象'}, None
+        code = submission.get('code')
+        if not isinstance(code, str) or not code.strip():
+            return {'success': False, 'error': f'第{index + 1}份代码为空'}, None
+    for index, test_case in enumerate(test_cases):
+        if not isinstance(test_case, dict):
+            return {'success': False, 'error': f'第{index + 1}个测试用例格式错误: 测试用例应为对象'}, None
+        for field in ('input', 'expected_output'):
+            if field in test_case and not isinstance(test_case[field], str):
+                return {'success': False, 'error': f'第{index + 1}个测试用例格式错误: {field}应为字符串'}, None
+    
+    def generate():
+        started = time.monotonic()
+        passed = 0
+        for result in CodeGrader.grade_batch(submissions, test_cases, bool(data.get('exact'))):
+            passed += result['passed']
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'type': 'summary',
+            'total': len(submissions),
+            'passed': passed,
+            'elapsed': round(time.monotonic() - started, 3),
+            'timestamp': datetime.now().isoformat()
+        }, ensure_ascii=False) + '\n'
+    
+    return None, generate()
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+@app.route('/api/run-python', methods=['POST'])
+def run_python():
+    """执行Python代码"""
+    return jsonify(run_python_result(request.get_json(silent=True)))
+
+@app.route('/api/run-python/stream', methods=['POST'])
+def run_python_stream():
+    """执行Python代码，以Server-Sent Events边执行边返回输出"""
+    return Response(run_python_events(request.get_json(silent=True)), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/evaluate-code', methods=['POST'])
+def evaluate_code():
+    """评估代码质量"""
+    return jsonify(evaluate_code_result(request.get_json(silent=True)))
+
+@app.route('/api/evaluate-batch', methods=['POST'])
+def evaluate_batch():
+    """批量评测：N份代码 × M个测试用例，以NDJSON逐行返回每份代码的结果"""
+    error, lines = evaluate_batch_lines(request.get_json(silent=True))
+    if error:
+        return jsonify(error)
+    return Response(lines, mimetype='application/x-ndjson')
 
 @app.route('/api/get-hint', methods=['POST'])
 def get_hint():
@@ -356,11 +1758,24 @@ def get_hint():
 def get_chapter(chapter_id):
     """获取章节内容"""
     try:
-        content = ContentManager.load_chapter_content(chapter_id)
+        content = {}
+        
+        def build():
+            content.update(ContentManager.load_chapter_content(chapter_id))
+            if 'error' in content:
+                return None
+            return {
+                'success': True,
+                'chapter_id': chapter_id,
+                'content': content
+            }
+        
+        response = cached_json_response(('chapter', chapter_id), chapter_library.version(chapter_id), build)
+        if response is not None:
+            return response
         return jsonify({
-            'success': True,
-            'chapter_id': chapter_id,
-            'content': content
+            'success': False,
+            'error': f"加载章节失败: {content.get('error', '章节不存在')}"
         })
     except Exception as e:
         return jsonify({
@@ -368,20 +1783,102 @@ def get_chapter(chapter_id):
             'error': f'加载章节失败: {str(e)}'
         })
 
+@app.route('/api/chapter/<int:chapter_id>/toc')
+def get_chapter_toc(chapter_id):
+    """获取章节目录（各节标题和字节范围）"""
+    try:
+        def build():
+            sections = chapter_library.sections(chapter_id)
+            if sections is None:
+                return None
+            return {
+                'success': True,
+                'chapter_id': chapter_id,
+                'title': chapter_library.index[chapter_id]['title'],
+                'sections': sections
+            }
+        
+        response = cached_json_response(('toc', chapter_id), chapter_library.version(chapter_id), build)
+        if response is not None:
+            return response
+        return jsonify({
+            'success': False,
+            'error': f'第{chapter_id}章不存在'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'加载章节目录失败: {str(e)}'
+        })
+
+@app.route('/api/chapter/<int:chapter_id>/section/<int:section_index>')
+def get_chapter_section(chapter_id, section_index):
+    """获取章节中的一节（按需加载大章节）"""
+    try:
+        def build():
+            section = chapter_library.get_section(chapter_id, section_index)
+            if section is None:
+                return None
+            return {
+                'success': True,
+                'chapter_id': chapter_id,
+                'section': section
+            }
+        
+        response = cached_json_response(
+            ('section', chapter_id, section_index), chapter_library.version(chapter_id), build
+        )
+        if response is not None:
+            return response
+        return jsonify({
+            'success': False,
+            'error': '章节或小节不存在'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'加载小节失败: {str(e)}'
+        })
+
+@app.route('/api/chapter/<int:chapter_id>/exercises')
+def get_chapter_exercises(chapter_id):
+    """获取章节中的全部练习题"""
+    try:
+        def build():
+            return {
+                'success': True,
+                'chapter_id': chapter_id,
+                'exercises': [exercise.to_dict() for exercise in exercise_repository.for_chapter(chapter_id)]
+            }
+        
+        exercise_repository.refresh()
+        return cached_json_response(('exercises', chapter_id), exercise_repository.version, build)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'获取练习题失败: {str(e)}'
+        })
+
 @app.route('/api/exercise/<exercise_id>')
 def get_exercise(exercise_id):
     """获取练习题详情"""
     try:
-        exercise = ContentManager.get_exercise_by_id(exercise_id)
-        if not exercise:
-            return jsonify({
-                'success': False,
-                'error': '练习题不存在'
-            })
+        def build():
+            exercise = ContentManager.get_exercise_by_id(exercise_id)
+            if not exercise:
+                return None
+            return {
+                'success': True,
+                'exercise': exercise
+            }
         
+        exercise_repository.refresh()
+        response = cached_json_response(('exercise', exercise_id), exercise_repository.version, build)
+        if response is not None:
+            return response
         return jsonify({
-            'success': True,
-            'exercise': exercise
+            'success': False,
+            'error': '练习题不存在'
         })
     except Exception as e:
         return jsonify({
@@ -393,26 +1890,51 @@ def get_exercise(exercise_id):
 def handle_progress():
     """处理学习进度"""
     if request.method == 'GET':
-        # 获取进度（这里应该从数据库读取）
-        return jsonify({
-            'success': True,
-            'progress': {
-                'completed_chapters': [],
-                'total_chapters': 18,
-                'current_chapter': 1,
-                'exercises_completed': 0,
-                'total_exercises': 72
-            }
-        })
+        user_id = request.args.get('user_id', 'guest')
+        if not user_id or len(user_id) > 64:
+            return jsonify({
+                'success': False,
+                'error': '用户ID无效'
+            })
+        try:
+            return jsonify({
+                'success': True,
+                'user_id': user_id,
+                'progress': progress_store.get(user_id)
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': f'读取进度失败: {str(e)}'
+            })
     
     elif request.method == 'POST':
-        # 保存进度
+        # 保存进度（先写入缓冲区，后台批量写入数据库）
         try:
-            data = request.get_json()
-            # 这里应该保存到数据库
+            data = request.get_json(silent=True) or {}
+            user_id = str(data.get('user_id', 'guest'))
+            changes = data.get('progress', {k: v for k, v in data.items() if k != 'user_id'})
+            if not user_id or len(user_id) > 64:
+                return jsonify({
+                    'success': False,
+                    'error': '用户ID无效'
+                })
+            if not isinstance(changes, dict):
+                return jsonify({
+                    'success': False,
+                    'error': '进度数据格式错误'
+                })
+            if len(json.dumps(changes, ensure_ascii=False).encode('utf-8')) > PROGRESS_MAX_BYTES:
+                return jsonify({
+                    'success': False,
+                    'error': '进度数据过大'
+                })
+            
+            progress = progress_store.update(user_id, changes)
             return jsonify({
                 'success': True,
-                'message': '进度保存成功'
+                'message': '进度保存成功',
+                'progress': progress
             })
         except Exception as e:
             return jsonify({
@@ -420,9 +1942,8 @@ def handle_progress():
                 'error': f'保存进度失败: {str(e)}'
             })
 
-@app.route('/api/examples')
-def get_code_examples():
-    """获取代码示例"""
+def builtin_examples_payload():
+    """内置代码示例的响应数据"""
     examples = [
         {
             'title': 'Hello World',
@@ -515,9 +2036,95 @@ for i in range(1, 4):
         }
     ]
     
-    return jsonify({
+    return {
         'success': True,
         'examples': examples
+    }
+
+@app.route('/api/examples')
+def get_code_examples():
+    """获取代码示例
+    
+    不带参数时返回内置示例；带 chapter/page/per_page 参数时分页返回教材中的代码块
+    """
+    if not {'chapter', 'page', 'per_page'} & set(request.args):
+        return cached_json_response('examples', 0, builtin_examples_payload)
+    
+    try:
+        chapter_id = request.args.get('chapter', type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), EXAMPLES_MAX_PER_PAGE)
+        
+        def build():
+            return dict(example_index.page(chapter_id, page, per_page), success=True)
+        
+        return cached_json_response(
+            ('examples', chapter_id, page, per_page), example_index.version(chapter_id), build
+        )
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'加载代码示例失败: {str(e)}'
+        })
+
+@app.route('/api/examples/<example_id>')
+def get_code_example(example_id):
+    """按编号获取教材中的一个代码示例"""
+    example = example_index.get(example_id)
+    if example is None:
+        return jsonify({
+            'success': False,
+            'error': '代码示例不存在'
+        })
+    return jsonify({
+        'success': True,
+        'example': example
+    })
+
+@app.route('/api/search')
+def search_books():
+    """全文检索三册教材，返回匹配的章节小节和摘要"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'success': False,
+            'error': '检索词不能为空'
+        })
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), SEARCH_MAX_RESULTS)
+    except ValueError:
+        limit = 10
+    
+    try:
+        refresh_search_index()
+        started = time.perf_counter()
+        results = search_index.search(query, limit=limit)
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'检索失败: {str(e)}'
+        })
+
+@app.route('/api/stats')
+def get_stats():
+    """获取各类缓存的统计信息"""
+    return jsonify({
+        'success': True,
+        'code_cache': code_cache.stats(),
+        'result_cache': result_cache.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'chapter_cache': chapter_library.stats(),
+        'search_index': search_index.stats(),
+        'example_index': example_index.stats(),
+        'progress_store': progress_store.stats(),
+        'exercises': exercise_repository.stats()
     })
 
 @app.errorhandler(404)
@@ -0,0 +1,215 @@
+"""
+Python教学平台的ASGI服务入口
+
+与 app.py 提供相同的路由，区别在于：
+1. 代码执行类接口（/api/run-python、/api/evaluate-code 及其流式版本）在专用的执行线程池
+   （EXECUTION_WORKERS个线程）中等待沙箱进程池的结果，每个正在执行的任务占用其中一个线程，
+   线程都在忙时后到的执行请求排队等待；
+2. 其余轻量接口（/api/examples、/api/chapter/<id>、/api/get-hint 等）交给 Flask 应用，
+   在另一个独立的线程池中处理，不会排在耗时的代码执行后面。
+
+启动方式（在教学平台目录下）：
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+或：
+    python asgi.py
+"""
+
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app as platform
+
+# 处理轻量接口的线程
+LIGHT_WORKERS = 8
+# 等待沙箱执行结果的线程，大部分时间阻塞在管道上，可以比工作进程多
+EXECUTION_WORKERS = platform.sandbox_pool.size * 4
+
+light_executor = ThreadPoolExecutor(max_workers=LIGHT_WORKERS, thread_name_prefix='asgi-light')
+execution_executor = ThreadPoolExecutor(max_workers=EXECUTION_WORKERS, thread_name_prefix='asgi-exec')
+
+_END = object()
+
+
+async def _read_body(receive):
+    """读取完整的请求体"""
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def _parse_json(body):
+    """解析JSON请求体，格式错误时返回None（与Flask的get_json(silent=True)一致）"""
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def _send_json(send, payload, status=200):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_stream(send, content_type, lines, extra_headers=None):
+    """在执行线程中逐块取出同步生成器的内容并发送"""
+    loop = asyncio.get_running_loop()
+    headers = [(b'content-type', content_type.encode())]
+    for name, value in (extra_headers or {}).items():
+        headers.append((name.lower().encode(), value.encode()))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    try:
+        while True:
+            chunk = await loop.run_in_executor(execution_executor, next, lines, _END)
+            if chunk is _END:
+                break
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await loop.run_in_executor(execution_executor, lines.close)
+
+
+async def run_python(body, send):
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(execution_executor, platform.run_python_result, _parse_json(body))
+    await _send_json(send, payload)
+
+
+async def run_python_stream(body, send):
+    lines = platform.run_python_events(_parse_json(body))
+    await _send_stream(send, 'text/event-stream', lines, platform.SSE_HEADERS)
+
+
+async def evaluate_code(body, send):
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(execution_executor, platform.evaluate_code_result, _parse_json(body))
+    await _send_json(send, payload)
+
+
+async def evaluate_batch(body, send):
+    error, lines = platform.evaluate_batch_lines(_parse_json(body))
+    if error:
+        await _send_json(send, error)
+    else:
+        await _send_stream(send, 'application/x-ndjson', lines)
+
+
+# 在事件循环中直接处理的执行类接口
+ASYNC_ROUTES = {
+    ('POST', '/api/run-python'): run_python,
+    ('POST', '/api/run-python/stream'): run_python_stream,
+    ('POST', '/api/evaluate-code'): evaluate_code,
+    ('POST', '/api/evaluate-batch'): evaluate_batch,
+}
+
+
+def _wsgi_environ(scope, body):
+    """根据ASGI的scope构造WSGI环境"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_flask(environ):
+    """在线程中调用Flask应用，返回状态码、响应头和完整响应体"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    result = platform.app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+async def _delegate_to_flask(scope, body, send):
+    loop = asyncio.get_running_loop()
+    status, headers, content = await loop.run_in_executor(
+        light_executor, _call_flask, _wsgi_environ(scope, body)
+    )
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': content})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # 在开始接收请求前创建沙箱工作进程（由进程池的spawner线程fork）
+            platform.sandbox_pool.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            platform.sandbox_pool.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI应用入口"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    body = await _read_body(receive)
+    handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+    if handler is not None:
+        await handler(body, send)
+    else:
+        await _delegate_to_flask(scope, body, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Python教学平台（ASGI模式）启动中...")
+    print("🌐 访问地址：http://localhost:5000")
+    print("-" * 50)
+
+    uvicorn.run(application, host='0.0.0.0', port=5000)
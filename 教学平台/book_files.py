@@ -0,0 +1,44 @@
+"""
+教材章节文件
+
+三册书的目录名和章节文件（第N章-标题.md）的列举，
+章节渲染、全文检索、代码示例索引和练习题库共用。
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List
+
+BOOK_DIRS = [
+    '第一册-Python基础与核心技术',
+    '第二册-AI技术与智能体开发',
+    '第三册-高级应用与产品化'
+]
+CHAPTER_FILE_PATTERN = re.compile(r'^第(\d+)章-(.+)\.md$')
+
+
+def chapter_files(root: Path, book_dirs: List[str] = BOOK_DIRS) -> List[Dict]:
+    """列出各册书目录下的章节文件（第N章-标题.md），按章节号排序
+
+    path为相对root的路径，第一级目录即所在的册。
+    """
+    root = Path(root)
+    files = []
+    for book in book_dirs:
+        book_path = root / book
+        if not book_path.is_dir():
+            continue
+        for path in sorted(book_path.iterdir()):
+            match = CHAPTER_FILE_PATTERN.match(path.name)
+            if not match:
+                continue
+            stat = path.stat()
+            files.append({
+                'path': str(path.relative_to(root)),
+                'chapter_id': int(match.group(1)),
+                'title': f'第{match.group(1)}章 {match.group(2)}',
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size
+            })
+    files.sort(key=lambda item: item['chapter_id'])
+    return files
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+教材代码示例索引
+
+功能:
+1. 扫描三册书中全部 ```python 代码块，记录所在章节、小节、行号范围和内容哈希
+2. 索引保存为JSON文件，按文件修改时间增量更新，不需要每次请求都解析Markdown
+3. 代码内容只保存字节偏移，分页返回时才从源文件读取
+4. 每个代码块有稳定的编号（章节号-内容哈希），可以直接按编号运行
+
+命令行用法:
+    python example_index.py            # 构建索引并输出统计
+    python example_index.py 10         # 列出第10章的代码示例
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from book_files import BOOK_DIRS, chapter_files
+from search_index import HEADING_PATTERN
+
+INDEX_VERSION = 1
+DESCRIPTION_MAX_LENGTH = 80
+
+
+def scan_code_blocks(root: Path, item: Dict) -> List[Dict]:
+    """逐行扫描章节文件，返回其中每个 ```python 代码块的位置信息"""
+    blocks = []
+    section = ''
+    last_text = ''
+    fence = None  # 当前代码块的语言，不在代码块中时为None
+    offset = 0
+    start_line = start_offset = 0  # 当前python代码块第一行的行号和字节偏移
+    with open(root / item['path'], 'rb') as f:
+        for line_no, line in enumerate(f, 1):
+            if line.startswith(b'```'):
+                info = line[3:].strip().decode('utf-8')
+                closing = fence is not None
+                if closing:
+                    if fence == 'python' and offset > start_offset:
+                        blocks.append({
+                            'chapter_id': item['chapter_id'],
+                            'chapter_title': item['title'],
+                            'section': section,
+                            'description': last_text.strip('*：: ')[:DESCRIPTION_MAX_LENGTH],
+                            'start_line': start_line,
+                            'end_line': line_no - 1,
+                            'offset': start_offset,
+                            'length': offset - start_offset
+                        })
+                    fence = None
+                    last_text = ''
+                # 结束标记不带语言名，代码块未闭合就遇到 ```python 时当作新代码块的开始
+                if info or not closing:
+                    fence = info
+                    if fence == 'python':
+                        start_line, start_offset = line_no + 1, offset + len(line)
+            elif fence is None:
+                if HEADING_PATTERN.match(line) or line.startswith(b'# '):
+                    section = line.lstrip(b'#').decode('utf-8').strip()
+                    last_text = ''
+                elif line.strip():
+                    last_text = line.decode('utf-8').strip()
+            offset += len(line)
+    return blocks
+
+
+class ExampleIndex:
+    """代码示例索引，首次使用时加载"""
+
+    def __init__(self, index_path: str, root: str, book_dirs: List[str], check_interval: float = 2.0):
+        self.index_path = Path(index_path)
+        self.root = Path(root)
+        self.book_dirs = book_dirs
+        self.check_interval = check_interval
+        self.files: Dict[str, Dict] = {}
+        self.examples: List[Dict] = []
+        self.by_id: Dict[str, Dict] = {}
+        self.by_chapter: Dict[int, List[Dict]] = {}
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """读取磁盘上的索引文件，版本不符或损坏时视为空索引"""
+        self._loaded = True
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != INDEX_VERSION:
+            return
+        self.files = data['files']
+        self._set_examples(data['examples'])
+
+    def _set_examples(self, examples: List[Dict]):
+        self.examples = examples
+        self.by_id = {example['id']: example for example in examples}
+        self.by_chapter = {}
+        for example in examples:
+            self.by_chapter.setdefault(example['chapter_id'], []).append(example)
+
+    def refresh(self, force: bool = False) -> int:
+        """检查章节文件的修改时间，重新扫描有变化的文件，返回重新扫描的文件数
+
+        距离上次检查不到check_interval秒时直接返回0。
+        """
+        now = time.monotonic()
+        if not force and self._loaded and now - self._checked_at < self.check_interval:
+            return 0
+        with self._lock:
+            if not force and self._loaded and now - self._checked_at < self.check_interval:
+                return 0
+            if not self._loaded:
+                self._load()
+            files = {item['path']: item for item in chapter_files(self.root, self.book_dirs)}
+            changed = [item for path, item in files.items()
+                       if self.files.get(path, {}).get('mtime') != item['mtime']
+                       or self.files[path]['size'] != item['size']]
+            self._checked_at = time.monotonic()
+            if not changed and files.keys() == self.files.keys():
+                return 0
+
+            changed_paths = {item['path'] for item in changed}
+            examples_by_path = {}
+            for example in self.examples:
+                if example['path'] in files and example['path'] not in changed_paths:
+                    examples_by_path.setdefault(example['path'], []).append(example)
+            for item in changed:
+                examples_by_path[item['path']] = self._scan(item)
+
+            examples = []
+            for item in sorted(files.values(), key=lambda item: item['chapter_id']):
+                examples.extend(examples_by_path.get(item['path'], []))
+            self.files = files
+            self._set_examples(examples)
+            self._save()
+            return len(changed)
+
+    def _scan(self, item: Dict) -> List[Dict]:
+        """扫描一个文件并为代码块计算哈希和编号"""
+        content = (self.root / item['path']).read_bytes()
+        blocks = scan_code_blocks(self.root, item)
+        seen = {}
+        for block in blocks:
+            code = content[block['offset']:block['offset'] + block['length']]
+            digest = hashlib.sha256(code).hexdigest()[:16]
+            example_id = f"{item['chapter_id']}-{digest[:10]}"
+            seen[example_id] = seen.get(example_id, 0) + 1
+            if seen[example_id] > 1:  # 同一章中内容完全相同的代码块
+                example_id = f"{example_id}-{seen[example_id]}"
+            block.update(id=example_id, hash=digest, path=item['path'])
+        return blocks
+
+    def _save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'files': self.files, 'examples': self.examples},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def version(self, chapter_id: Optional[int] = None) -> int:
+        """章节文件（未指定章节时为全部文件）的最新修改时间，作为缓存版本号"""
+        self.refresh()
+        mtimes = [item['mtime'] for item in self.files.values()
+                  if chapter_id is None or item['chapter_id'] == chapter_id]
+        return max(mtimes, default=0)
+
+    def code(self, example: Dict) -> str:
+        """从源文件中读取代码块内容"""
+        with open(self.root / example['path'], 'rb') as f:
+            f.seek(example['offset'])
+            return f.read(example['length']).decode('utf-8')
+
+    def _public(self, example: Dict) -> Dict:
+        result = {key: value for key, value in example.items() if key not in ('path', 'offset', 'length')}
+        result['code'] = self.code(example)
+        return result
+
+    def get(self, example_id: str) -> Optional[Dict]:
+        """按编号获取代码示例（包含代码）"""
+        self.refresh()
+        example = self.by_id.get(example_id)
+        return self._public(example) if example else None
+
+    def page(self, chapter_id: Optional[int] = None, page: int = 1, per_page: int = 20) -> Dict:
+        """分页列出代码示例，只读取当前页的代码"""
+        self.refresh()
+        examples = self.examples if chapter_id is None else self.by_chapter.get(chapter_id, [])
+        start = (page - 1) * per_page
+        return {
+            'chapter_id': chapter_id,
+            'page': page,
+            'per_page': per_page,
+            'total': len(examples),
+            'pages': (len(examples) + per_page - 1) // per_page,
+            'examples': [self._public(example) for example in examples[start:start + per_page]]
+        }
+
+    def stats(self) -> Dict:
+        return {
+            'loaded': self._loaded,
+            'files': len(self.files),
+            'examples': len(self.examples),
+            'chapters': len(self.by_chapter)
+        }
+
+
+def main():
+    """主函数"""
+    base_dir = Path(__file__).resolve().parent
+    index_path = os.environ.get('EXAMPLE_INDEX_PATH', str(base_dir / '.cache' / 'examples.json'))
+    index = ExampleIndex(index_path, str(base_dir.parent), BOOK_DIRS)
+
+    print(f"重新扫描 {index.refresh(force=True)} 个文件")
+    print(index.stats())
+    if len(sys.argv) > 1:
+        for example in index.page(int(sys.argv[1]), per_page=1000)['examples']:
+            print(f"{example['id']:<16} 第{example['start_line']}-{example['end_line']}行  "
+                  f"{example['section']} / {example['description']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+练习题库
+
+从章节Markdown中的练习小节（`#### 练习N：标题`，以及第10章的 `**练习N：标题**`）提取练习题，
+每道题保存为不可变的 Exercise 记录，按编号和章节建立索引。
+章节文件修改后只重新解析该文件，并整体替换索引，查询时不需要加锁。
+"""
+
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from book_files import chapter_files
+
+EXERCISE_PATTERN = re.compile(r'^(?:#{3,4} |\*\*)练习(\d+)[：:]\s*(.+?)(?:\*\*)?\s*$')
+HINT_PATTERN = re.compile(r'^\s*#\s*(?:TODO[:：]?|提示[:：]|\d+\.)\s*(.+)$')
+DEFAULT_HINT = "继续努力，你能做到的！"
+
+
+class TestCase(NamedTuple):
+    input: str
+    expected_output: str
+
+
+class Exercise(NamedTuple):
+    """一道练习题"""
+    id: str
+    chapter_id: int
+    number: int
+    title: str
+    description: str
+    difficulty: str
+    template: str
+    expected_output: str
+    hints: Tuple[str, ...]
+    test_cases: Tuple[TestCase, ...]
+
+    def to_dict(self):
+        """转换为接口返回的格式"""
+        return {
+            'id': self.id,
+            'chapter_id': self.chapter_id,
+            'title': self.title,
+            'description': self.description,
+            'difficulty': self.difficulty,
+            'template': self.template,
+            'expected_output': self.expected_output,
+            'test_cases': [case._asdict() for case in self.test_cases]
+        }
+
+
+# 带测试用例的内置练习题，编号与教材中的练习相同时优先使用
+BUILTIN_EXERCISES = (
+    Exercise(
+        id='chapter1_exercise1',
+        chapter_id=1,
+        number=1,
+        title='个人信息输出程序',
+        description='编写一个程序，要求用户输入姓名、年龄和爱好，然后格式化输出个人信息。',
+        difficulty='基础',
+        template='''name = input("请输入您的姓名：")
+age = input("请输入您的年龄：")
+hobby = input("请输入您的爱好：")
+
+# TODO: 使用f-string格式化输出
+print(f"个人信息卡")
+# 请完成剩余代码...''',
+        expected_output='',
+        hints=(
+            "使用f-string格式化字符串：f'文本{变量}'",
+            "记住使用input()函数获取用户输入",
+            "可以使用多个print()语句来格式化输出",
+            "注意输出格式要整齐美观"
+        ),
+        test_cases=(
+            TestCase('张三\n20\n编程', '个人信息卡\n==================\n姓名：张三\n年龄：20岁\n爱好：编程'),
+        )
+    ),
+)
+
+
+def difficulty_of(heading):
+    """根据练习所在小节的标题判断难度"""
+    if '基础' in heading or 'Level 1' in heading:
+        return '基础'
+    if '中级' in heading or 'Level 2' in heading:
+        return '中级'
+    if any(word in heading for word in ('进阶', '高级', '挑战', '综合', 'Level 3', 'Level 4')):
+        return '进阶'
+    return ''
+
+
+def parse_exercise(chapter_id: int, number: int, title: str, difficulty: str, lines: List[str]) -> Exercise:
+    """解析一道练习题的正文：代码块之前的文字是题目描述，第一个python代码块是模板"""
+    description = []
+    blocks = []  # (代码块前一行文字, 语言, 代码行)
+    fence = None
+    previous = ''
+    for line in lines:
+        if line.startswith('```'):
+            if fence is None:
+                fence = (previous, line[3:].strip(), [])
+            else:
+                blocks.append(fence)
+                fence = None
+        elif fence is not None:
+            fence[2].append(line)
+        elif line.strip():
+            previous = line.strip()
+            if not blocks and '期望输出' not in previous:
+                description.append(previous.replace('**任务描述：**', '').strip())
+
+    template = next(('\n'.join(code) for _, language, code in blocks if language == 'python'), '')
+    expected_output = next(('\n'.join(code) for before, language, code in blocks
+                            if '期望输出' in before and language != 'python'), '')
+    hints = [match.group(1).strip() for match in map(HINT_PATTERN.match, template.split('\n')) if match]
+    hints += [line[2:].strip() for line in description if line.startswith('- ')]
+    return Exercise(
+        id=f'chapter{chapter_id}_exercise{number}',
+        chapter_id=chapter_id,
+        number=number,
+        title=title,
+        description='\n'.join(description),
+        difficulty=difficulty,
+        template=template,
+        expected_output=expected_output,
+        hints=tuple(hints) or (DEFAULT_HINT,),
+        test_cases=()
+    )
+
+
+def parse_chapter_exercises(path: Path, chapter_id: int) -> List[Exercise]:
+    """逐行扫描章节文件，提取其中的全部练习题"""
+    exercises = []
+    heading = ''
+    current = None  # (编号, 标题, 难度, 正文行)
+    in_code = False
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('```'):
+                in_code = not in_code
+            elif not in_code:
+                match = EXERCISE_PATTERN.match(line)
+                if match or line.startswith('#'):
+                    if current is not None:
+                        exercises.append(parse_exercise(chapter_id, *current))
+                        current = None
+                    if match:
+                        current = (int(match.group(1)), match.group(2).strip(), difficulty_of(heading), [])
+                    else:
+                        heading = line
+                    continue
+            if current is not None:
+                current[3].append(line)
+    if current is not None:
+        exercises.append(parse_exercise(chapter_id, *current))
+
+    # 同一章中编号重复的练习（例如各小节分别从练习1开始）只保留第一个
+    unique = {}
+    for exercise in exercises:
+        unique.setdefault(exercise.id, exercise)
+    return list(unique.values())
+
+
+class ExerciseRepository:
+    """练习题库，按编号和章节索引，章节文件修改后自动重新加载"""
+
+    def __init__(self, root: str, book_dirs: List[str], check_interval: float = 2.0):
+        self.root = Path(root)
+        self.book_dirs = book_dirs
+        self.check_interval = check_interval
+        self.by_id: Dict[str, Exercise] = {}
+        self.by_chapter: Dict[int, Tuple[Exercise, ...]] = {}
+        self.version = 0  # 每次重新加载后加一，用作响应缓存的版本号
+        self._files: Dict[str, Tuple[int, int]] = {}
+        self._parsed: Dict[str, List[Exercise]] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False):
+        """检查章节文件的修改时间，只重新解析有变化的文件"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < self.check_interval:
+                return
+            files = chapter_files(self.root, self.book_dirs)
+            current = {item['path']: (item['mtime'], item['size']) for item in files}
+            if current != self._files:
+                parsed = {}
+                for item in files:
+                    path = item['path']
+                    if self._files.get(path) == current[path]:
+                        parsed[path] = self._parsed[path]
+                    else:
+                        parsed[path] = parse_chapter_exercises(self.root / path, item['chapter_id'])
+                self._build(parsed)
+                self._files = current
+                self._parsed = parsed
+            self._checked_at = time.monotonic()
+
+    def _build(self, parsed: Dict[str, List[Exercise]]):
+        """生成新的索引后整体替换，正在进行的查询仍使用旧索引"""
+        by_id = {}
+        for exercises in parsed.values():
+            for exercise in exercises:
+                by_id[exercise.id] = exercise
+        for exercise in BUILTIN_EXERCISES:
+            by_id[exercise.id] = exercise
+
+        by_chapter = {}
+        for exercise in sorted(by_id.values(), key=lambda item: (item.chapter_id, item.number)):
+            by_chapter.setdefault(exercise.chapter_id, []).append(exercise)
+
+        self.by_id = by_id
+        self.by_chapter = {chapter_id: tuple(items) for chapter_id, items in by_chapter.items()}
+        self.version += 1
+
+    def get(self, exercise_id: str) -> Optional[Exercise]:
+        self.refresh()
+        return self.by_id.get(exercise_id)
+
+    def for_chapter(self, chapter_id: int) -> Tuple[Exercise, ...]:
+        self.refresh()
+        return self.by_chapter.get(chapter_id, ())
+
+    def stats(self):
+        return {
+            'exercises': len(self.by_id),
+            'chapters': len(self.by_chapter),
+            'version': self.version
+        }
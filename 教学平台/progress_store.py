@@ -0,0 +1,245 @@
+"""
+学习进度存储
+
+ProgressStore 在内存中缓存每个用户的进度，保存请求先写入待写缓冲区，
+由后台线程定期合并成一个事务批量写入存储后端。同一用户在两次写入之间的多次自动保存只写一次。
+
+存储后端可以替换：
+- SQLiteBackend：默认后端，WAL模式，读写互不阻塞
+- MemoryBackend：只保存在内存中，适合开发调试
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBackend(ABC):
+    """存储后端接口"""
+
+    @abstractmethod
+    def load(self, user_id):
+        """读取用户进度，没有记录时返回None"""
+
+    @abstractmethod
+    def save_many(self, items):
+        """在一个事务中保存多个用户的进度，items 为 {user_id: progress}"""
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(ProgressBackend):
+    """内存后端，进程退出后数据丢失"""
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        with self._lock:
+            value = self.data.get(user_id)
+        return json.loads(value) if value is not None else None
+
+    def save_many(self, items):
+        encoded = {user_id: json.dumps(progress, ensure_ascii=False) for user_id, progress in items.items()}
+        with self._lock:
+            self.data.update(encoded)
+
+
+class SQLiteBackend(ProgressBackend):
+    """SQLite后端
+
+    使用WAL日志模式：写入只由后台刷新线程进行，读取使用各线程自己的连接，不会被写入阻塞。
+    创建过的连接都登记在 _connections 中，close() 时全部关闭。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._connections = {}  # 线程 -> 该线程的连接
+        self._connections_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS progress ('
+            'user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 连接只在创建它的线程中使用，但close()需要在其他线程中关闭它
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')  # WAL模式下只在检查点时fsync
+            self._local.conn = conn
+            with self._connections_lock:
+                # 顺便关闭已结束的线程留下的连接
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def load(self, user_id):
+        row = self._connection().execute(
+            'SELECT data FROM progress WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, items):
+        now = time.time()
+        rows = [(user_id, json.dumps(progress, ensure_ascii=False), now) for user_id, progress in items.items()]
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    'INSERT INTO progress (user_id, data, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                    rows
+                )
+
+    def close(self):
+        """关闭所有线程的连接"""
+        with self._connections_lock:
+            connections, self._connections = list(self._connections.values()), {}
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+
+class ProgressStore:
+    """带读缓存和延迟批量写入的进度存储"""
+
+    def __init__(self, backend, defaults=None, flush_interval=1.0, cache_max_users=10000):
+        self.backend = backend
+        self.defaults = defaults or {}
+        self.flush_interval = flush_interval
+        self.cache_max_users = cache_max_users
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.writes = 0
+        self.flushes = 0
+
+    def _remember(self, user_id, progress):
+        """放入LRU缓存，超出容量时淘汰最久未用且已写入后端的用户"""
+        self._cache[user_id] = progress
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_max_users:
+            oldest = next(iter(self._cache))
+            if oldest in self._pending:
+                break
+            del self._cache[oldest]
+
+    def get(self, user_id):
+        """读取用户进度，没有记录时返回默认值"""
+        with self._lock:
+            progress = self._cache.get(user_id)
+            if progress is not None:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return dict(progress)
+            self.misses += 1
+
+        stored = self.backend.load(user_id)
+        progress = dict(self.defaults, **(stored or {}))
+        with self._lock:
+            # 读取后端期间可能已有新的保存，以缓存中的为准
+            progress = self._cache.setdefault(user_id, progress)
+            self._remember(user_id, progress)
+            return dict(progress)
+
+    def update(self, user_id, changes):
+        """合并保存用户进度，返回合并后的进度；实际写入由后台线程批量完成"""
+        current = self.get(user_id)
+        with self._lock:
+            progress = dict(self._cache.get(user_id, current), **changes)
+            self._remember(user_id, progress)
+            self._pending[user_id] = progress
+            self.updates += 1
+        self._ensure_flusher()
+        return dict(progress)
+
+    def _ensure_flusher(self):
+        # 第一次保存时才启动刷新线程，避免在沙箱进程池fork之前创建线程
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._flush_loop, name='progress-flusher', daemon=True)
+                    self._thread.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("保存学习进度失败")
+
+    def flush(self):
+        """把待写缓冲区中的进度在一个事务中写入后端，返回写入的用户数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self.backend.save_many(batch)
+            except Exception:
+                with self._lock:
+                    # 写入失败时放回缓冲区，期间更新过的用户保留新值
+                    for user_id, progress in batch.items():
+                        self._pending.setdefault(user_id, progress)
+                raise
+            self.writes += len(batch)
+            self.flushes += 1
+            return len(batch)
+
+    def close(self):
+        """停止后台线程并写入剩余的进度"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        self.backend.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': type(self.backend).__name__,
+                'cached_users': len(self._cache),
+                'pending': len(self._pending),
+                'hits': self.hits,
+                'misses': self.misses,
+                'updates': self.updates,
+                'writes': self.writes,
+                'flushes': self.flushes
+            }
+
+
+def create_backend(name, path):
+    """根据名称创建存储后端"""
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(path)
+    raise ValueError(f'未知的进度存储后端: {name}')
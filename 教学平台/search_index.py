@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+教材全文检索索引
+
+功能:
+1. 把三册书的Markdown按标题（## / ###）切分为小节，小节是检索的基本单位
+2. 中文按单字和相邻两字（bigram）建立倒排索引，英文和代码按单词建立索引，
+   标题、正文和 ```python 代码块都会被索引
+3. 索引以紧凑的二进制格式保存到磁盘，查询时通过mmap直接读取，不需要整体加载
+4. 根据文件修改时间增量重建：未修改文件的倒排记录直接从旧索引中复制
+
+命令行用法:
+    python search_index.py build
+    python search_index.py query 数据清洗
+    python search_index.py benchmark 数据清洗 DataFrame 装饰器
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from book_files import BOOK_DIRS, chapter_files
+
+INDEX_MAGIC = b'PYSRCH01'
+# 魔数, 词项数, 倒排记录数, 元数据偏移/长度, 词项偏移表, 词项数据, 倒排偏移表, 倒排数据
+HEADER_FORMAT = '<8sIIQQQQQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9_]+|[一-鿿]+')
+HEADING_PATTERN = re.compile(rb'^#{2,3} ')
+SNIPPET_RADIUS = 40
+
+
+def tokenize(text: str, for_query: bool = False) -> List[str]:
+    """把文本切分为索引词项
+
+    英文、数字和下划线组成的单词整体作为一个词项；连续的中文字符生成单字和二字词项。
+    查询时中文只使用二字词项（单个汉字除外），结果更精确。
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        word = match.group()
+        if word[0] < '一':
+            tokens.append(word)
+            continue
+        if not for_query or len(word) == 1:
+            tokens.extend(word)
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def split_sections(path: Path) -> List[Dict]:
+    """按二、三级标题切分文件，返回各小节的标题和字节范围（代码块内的 # 行不算标题）"""
+    sections = []
+    title = ''
+    start = 0
+    offset = 0
+    in_code = False
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith(b'```'):
+                in_code = not in_code
+            elif not in_code and HEADING_PATTERN.match(line):
+                if offset > start:
+                    sections.append({'title': title, 'offset': start, 'length': offset - start})
+                title = line.lstrip(b'#').decode('utf-8').strip()
+                start = offset
+            elif not in_code and not title and line.startswith(b'# '):
+                title = line[2:].decode('utf-8').strip()
+            offset += len(line)
+    if offset > start:
+        sections.append({'title': title, 'offset': start, 'length': offset - start})
+    return sections
+
+
+class SearchIndex:
+    """基于mmap的倒排索引"""
+
+    def __init__(self, index_path: str, root: str, book_dirs: List[str]):
+        self.index_path = Path(index_path)
+        self.root = Path(root)
+        self.book_dirs = book_dirs
+        self.files: List[Dict] = []
+        self.docs: List[Dict] = []
+        self.n_terms = 0
+        self._mmap = None
+        self._lock = threading.Lock()
+        self._open()
+
+    # ---------- 读取 ----------
+
+    def _open(self):
+        """打开已有的索引文件，文件不存在或格式不符时保持为空索引"""
+        self._close()
+        try:
+            f = open(self.index_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # 空文件
+                return
+        header = struct.unpack_from(HEADER_FORMAT, data, 0) if len(data) >= HEADER_SIZE else None
+        if header is None or header[0] != INDEX_MAGIC:
+            data.close()
+            return
+        (_, self.n_terms, _, meta_offset, meta_length,
+         self._term_offsets_at, self._terms_at, self._posting_offsets_at, self._postings_at) = header
+        meta = json.loads(data[meta_offset:meta_offset + meta_length].decode('utf-8'))
+        self.files = meta['files']
+        self.docs = meta['docs']
+        self._mmap = data
+
+    def _close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = None
+        self.files = []
+        self.docs = []
+        self.n_terms = 0
+
+    def _term_at(self, i: int) -> bytes:
+        start, end = struct.unpack_from('<II', self._mmap, self._term_offsets_at + 4 * i)
+        return self._mmap[self._terms_at + start:self._terms_at + end]
+
+    def _find_term(self, term: str) -> int:
+        """在有序词项表中二分查找，返回序号，找不到返回-1"""
+        key = term.encode('utf-8')
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_terms and self._term_at(lo) == key:
+            return lo
+        return -1
+
+    def _postings_of(self, i: int) -> array:
+        """返回第i个词项的倒排记录：[文档号, 词频, 文档号, 词频, ...]"""
+        start, end = struct.unpack_from('<II', self._mmap, self._posting_offsets_at + 4 * i)
+        postings = array('I')
+        postings.frombytes(self._mmap[self._postings_at + 8 * start:self._postings_at + 8 * end])
+        return postings
+
+    def postings(self, term: str) -> Dict[int, int]:
+        """词项 -> {文档号: 词频}"""
+        i = self._find_term(term) if self._mmap is not None else -1
+        if i < 0:
+            return {}
+        postings = self._postings_of(i)
+        return dict(zip(postings[0::2], postings[1::2]))
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """检索包含全部查询词项的小节，按TF-IDF得分排序"""
+        terms = list(dict.fromkeys(tokenize(query, for_query=True)))
+        if not terms:
+            return []
+        with self._lock:
+            if self._mmap is None:
+                return []
+            # update()会整体替换docs和files，锁外生成结果时使用这一版的引用
+            docs, files = self.docs, self.files
+            posting_lists = []
+            for term in terms:
+                postings = self.postings(term)
+                if not postings:
+                    return []
+                posting_lists.append(postings)
+
+            posting_lists.sort(key=len)
+            candidates = set(posting_lists[0])
+            for postings in posting_lists[1:]:
+                candidates.intersection_update(postings)
+                if not candidates:
+                    return []
+
+            n_docs = len(docs)
+            scores = {}
+            for postings in posting_lists:
+                idf = math.log(1 + n_docs / len(postings))
+                for doc_id in candidates:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + (1 + math.log(postings[doc_id])) * idf
+
+            query_lower = query.strip().lower()
+            results = []
+            for doc_id, score in scores.items():
+                doc = docs[doc_id]
+                if query_lower and query_lower in doc['title'].lower():
+                    score *= 2  # 标题命中的小节排在前面
+                results.append((score, doc_id))
+            results.sort(key=lambda item: (-item[0], item[1]))
+            results = results[:limit]
+
+        return [self._result(docs[doc_id], files, score, query_lower) for score, doc_id in results]
+
+    def _result(self, doc: Dict, files: List[Dict], score: float, query_lower: str) -> Dict:
+        file_info = files[doc['file']]
+        return {
+            'chapter_id': file_info['chapter_id'],
+            'chapter_title': file_info['title'],
+            'section': doc['title'],
+            'offset': doc['offset'],
+            'score': round(score, 3),
+            'snippet': self._snippet(file_info, doc, query_lower)
+        }
+
+    def _snippet(self, file_info: Dict, doc: Dict, query_lower: str) -> str:
+        """读取小节原文，截取查询词附近的一段文字"""
+        try:
+            with open(self.root / file_info['path'], 'rb') as f:
+                f.seek(doc['offset'])
+                text = f.read(doc['length']).decode('utf-8', errors='ignore')
+        except OSError:
+            return ''
+        position = text.lower().find(query_lower) if query_lower else -1
+        if position < 0:
+            terms = tokenize(query_lower, for_query=True)
+            position = max(text.lower().find(terms[0]), 0) if terms else 0
+        start = max(position - SNIPPET_RADIUS, 0)
+        snippet = text[start:position + len(query_lower) + SNIPPET_RADIUS]
+        return ' '.join(snippet.split())
+
+    # ---------- 构建 ----------
+
+    def source_files(self) -> List[Dict]:
+        """列出三册书中的全部章节文件及其修改时间"""
+        return chapter_files(self.root, self.book_dirs)
+
+    def is_stale(self) -> bool:
+        """磁盘上的章节文件是否与索引记录的不一致"""
+        current = {(item['path'], item['mtime'], item['size']) for item in self.source_files()}
+        indexed = {(item['path'], item['mtime'], item['size']) for item in self.files}
+        return current != indexed
+
+    def update(self) -> Dict:
+        """增量更新索引：只重新切分和分词修改过的文件，返回本次更新的统计"""
+        started = time.perf_counter()
+        files = self.source_files()
+        with self._lock:
+            old_files = {item['path']: (file_id, item) for file_id, item in enumerate(self.files)}
+            reused = {}
+            for item in files:
+                old = old_files.get(item['path'])
+                if old and old[1]['mtime'] == item['mtime'] and old[1]['size'] == item['size']:
+                    reused[item['path']] = old[0]
+
+            if len(reused) == len(files) == len(self.files):
+                return {'files': len(files), 'rebuilt_files': 0, 'docs': len(self.docs),
+                        'terms': self.n_terms, 'elapsed': round(time.perf_counter() - started, 3)}
+
+            # 旧文档号 -> 新文档号（只保留未修改文件中的文档）
+            docs = []
+            doc_map = {}
+            postings = defaultdict(list)
+            changed = []
+            for file_id, item in enumerate(files):
+                if item['path'] in reused:
+                    old_file_id = reused[item['path']]
+                    for old_doc_id, doc in enumerate(self.docs):
+                        if doc['file'] == old_file_id:
+                            doc_map[old_doc_id] = len(docs)
+                            docs.append(dict(doc, file=file_id))
+                else:
+                    changed.append((file_id, item))
+
+            if doc_map:
+                for i in range(self.n_terms):
+                    old_postings = self._postings_of(i)
+                    kept = [(doc_map[doc_id], tf)
+                            for doc_id, tf in zip(old_postings[0::2], old_postings[1::2])
+                            if doc_id in doc_map]
+                    if kept:
+                        postings[self._term_at(i).decode('utf-8')].extend(kept)
+
+            for file_id, item in changed:
+                path = self.root / item['path']
+                content = path.read_bytes()
+                for section in split_sections(path):
+                    doc_id = len(docs)
+                    docs.append(dict(section, file=file_id))
+                    text = content[section['offset']:section['offset'] + section['length']].decode('utf-8')
+                    for term, tf in Counter(tokenize(text)).items():
+                        postings[term].append((doc_id, tf))
+
+            self._write(files, docs, postings)
+            self._open()
+        return {
+            'files': len(files),
+            'rebuilt_files': len(changed),
+            'docs': len(docs),
+            'terms': self.n_terms,
+            'elapsed': round(time.perf_counter() - started, 3)
+        }
+
+    def _write(self, files: List[Dict], docs: List[Dict], postings: Dict[str, list]):
+        """把索引写入临时文件后原子替换"""
+        terms = sorted(postings, key=lambda term: term.encode('utf-8'))
+        meta = json.dumps({'files': files, 'docs': docs}, ensure_ascii=False).encode('utf-8')
+
+        term_offsets = array('I', [0])
+        term_blob = bytearray()
+        posting_offsets = array('I', [0])
+        posting_data = array('I')
+        for term in terms:
+            term_blob += term.encode('utf-8')
+            term_offsets.append(len(term_blob))
+            for doc_id, tf in sorted(postings[term]):
+                posting_data.append(doc_id)
+                posting_data.append(tf)
+            posting_offsets.append(len(posting_data) // 2)
+        if sys.byteorder != 'little':
+            for values in (term_offsets, posting_offsets, posting_data):
+                values.byteswap()
+
+        def pad(size):
+            return b'\0' * (-size % 4)
+
+        meta_offset = HEADER_SIZE
+        term_offsets_at = meta_offset + len(meta) + len(pad(len(meta)))
+        terms_at = term_offsets_at + len(term_offsets) * 4
+        posting_offsets_at = terms_at + len(term_blob) + len(pad(len(term_blob)))
+        postings_at = posting_offsets_at + len(posting_offsets) * 4
+        header = struct.pack(HEADER_FORMAT, INDEX_MAGIC, len(terms), len(posting_data) // 2,
+                             meta_offset, len(meta), term_offsets_at, terms_at,
+                             posting_offsets_at, postings_at)
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(meta + pad(len(meta)))
+            f.write(term_offsets.tobytes())
+            f.write(bytes(term_blob) + pad(len(term_blob)))
+            f.write(posting_offsets.tobytes())
+            f.write(posting_data.tobytes())
+        self._close()
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self) -> Dict:
+        return {
+            'files': len(self.files),
+            'docs': len(self.docs),
+            'terms': self.n_terms,
+            'bytes': len(self._mmap) if self._mmap is not None else 0
+        }
+
+
+def naive_search(root: Path, files: List[Dict], query: str) -> List[str]:
+    """朴素检索（逐个读取文件做子串查找），用于和索引检索对比"""
+    query_lower = query.lower()
+    hits = []
+    for item in files:
+        with open(root / item['path'], encoding='utf-8') as f:
+            for line in f:
+                if query_lower in line.lower():
+                    hits.append(item['path'])
+    return hits
+
+
+def benchmark(index: SearchIndex, queries: List[str], repeat: int = 20):
+    """对比索引检索和朴素检索的耗时（毫秒）"""
+    files = index.source_files()
+    print(f"{'查询':<16}{'索引(ms)':>10}{'朴素(ms)':>10}{'结果数':>8}")
+    for query in queries:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            results = index.search(query, limit=10)
+        indexed_ms = (time.perf_counter() - started) * 1000 / repeat
+
+        started = time.perf_counter()
+        naive_search(index.root, files, query)
+        naive_ms = (time.perf_counter() - started) * 1000
+        print(f"{query:<16}{indexed_ms:>10.2f}{naive_ms:>10.1f}{len(results):>8}")
+
+
+def main():
+    """主函数"""
+    base_dir = Path(__file__).resolve().parent
+    root = base_dir.parent
+    index_path = os.environ.get('SEARCH_INDEX_PATH', str(base_dir / '.cache' / 'search.idx'))
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'build'
+    index = SearchIndex(index_path, str(root), BOOK_DIRS)
+
+    if command == 'build':
+        print(index.update())
+    elif command == 'query':
+        if index.is_stale():
+            index.update()
+        for result in index.search(' '.join(sys.argv[2:])):
+            print(f"[{result['score']}] {result['chapter_title']} / {result['section']}")
+            print(f"    {result['snippet']}")
+    elif command == 'benchmark':
+        print('全量构建:', SearchIndex(index_path + '.bench', str(root), BOOK_DIRS).update())
+        os.remove(index_path + '.bench')
+        print('增量更新:', index.update())
+        benchmark(index, sys.argv[2:] or ['DataFrame', '数据清洗', '装饰器', '神经网络', 'def main'])
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 测试时学习进度只保存在内存中
+os.environ.setdefault('PROGRESS_BACKEND', 'memory')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
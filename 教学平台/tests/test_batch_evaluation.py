@@ -0,0 +1,87 @@
+"""批量评测接口的输入检查和结果"""
+
+import json
+
+import pytest
+
+from app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('payload', [
+    [],
+    {'submissions': []},
+    {'submissions': 'print(1)'},
+    {'submissions': ['print(1)']},
+    {'submissions': [{'id': 'a'}]},
+    {'submissions': [{'code': ''}]},
+    {'submissions': [{'code': '   \n'}]},
+    {'submissions': [{'code': 42}]},
+    {'submissions': [{'code': 'print(1)'}, None]},
+    {'submissions': [{'code': 'print(1)'}], 'test_cases': {'input': ''}},
+    {'submissions': [{'code': 'print(1)'}], 'test_cases': ['1']},
+    {'submissions': [{'code': 'print(1)'}], 'test_cases': [{'input': 1}]},
+    {'submissions': [{'code': 'print(1)'}], 'test_cases': [{'expected_output': None}]},
+])
+def test_invalid_batches_are_rejected_before_streaming(client, payload):
+    response = client.post('/api/evaluate-batch', json=payload)
+    assert response.mimetype == 'application/json'
+    data = response.get_json()
+    assert data['success'] is False
+    assert data['error']
+
+
+def test_batch_streams_one_result_per_submission(client):
+    response = client.post('/api/evaluate-batch', json={
+        'submissions': [
+            {'id': 'right', 'code': 'print(int(input()) * 2)'},
+            {'id': 'wrong', 'code': 'print(int(input()) + 2)'},
+        ],
+        'test_cases': [
+            {'input': '3', 'expected_output': '6'},
+            {'input': '5', 'expected_output': '10'},
+        ]
+    })
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    results = {line['id']: line for line in lines if line['type'] == 'result'}
+    assert results['right']['passed'] is True
+    assert results['wrong']['passed'] is False
+    assert results['wrong']['passed_cases'] == 0
+    assert lines[-1]['type'] == 'summary'
+    assert lines[-1]['total'] == 2
+    assert lines[-1]['passed'] == 1
+
+
+def test_batch_keeps_a_bounded_window_off_the_interactive_executor(monkeypatch):
+    import app as platform
+
+    class CountingExecutor:
+        def __init__(self, executor):
+            self.executor = executor
+            self.pending = set()
+            self.max_pending = 0
+            self.submitted = 0
+
+        def submit(self, fn, *args):
+            future = self.executor.submit(fn, *args)
+            self.pending = {item for item in self.pending if not item.done()} | {future}
+            self.max_pending = max(self.max_pending, len(self.pending))
+            self.submitted += 1
+            return future
+
+    counting = CountingExecutor(platform.batch_executor)
+    monkeypatch.setattr(platform, 'batch_executor', counting, raising=True)
+    # 共享的交互式线程池不应收到批量任务
+    monkeypatch.setattr(platform, 'dispatch_executor', None)
+    submissions = [{'code': f'print({index})'} for index in range(6)]
+    cases = [{'input': ''}, {'input': ''}]
+    results = list(platform.CodeGrader.grade_batch(submissions, cases))
+    assert sorted(result['index'] for result in results) == list(range(6))
+    assert all(result['passed'] for result in results)
+    assert counting.submitted == 12
+    assert counting.max_pending <= platform.BATCH_WORKERS
@@ -0,0 +1,44 @@
+"""预压缩JSON响应的ETag和条件请求"""
+
+import gzip
+import json
+
+import pytest
+
+import app as app_module
+from app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def test_each_content_coding_has_its_own_etag(client):
+    identity = client.get('/api/examples', headers={'Accept-Encoding': 'identity'})
+    gzipped = client.get('/api/examples', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in identity.headers
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert identity.headers['Vary'] == 'Accept-Encoding'
+    assert gzipped.headers['Vary'] == 'Accept-Encoding'
+    assert identity.headers['ETag'] != gzipped.headers['ETag']
+    assert json.loads(gzip.decompress(gzipped.data)) == identity.get_json()
+
+
+@pytest.mark.skipif(app_module.brotli is None, reason='未安装brotli')
+def test_brotli_etag_differs_from_gzip(client):
+    gzipped = client.get('/api/examples', headers={'Accept-Encoding': 'gzip'})
+    brotli = client.get('/api/examples', headers={'Accept-Encoding': 'br, gzip'})
+    assert brotli.headers['Content-Encoding'] == 'br'
+    assert brotli.headers['ETag'] != gzipped.headers['ETag']
+
+
+def test_not_modified_only_for_the_matching_representation(client):
+    gzipped = client.get('/api/examples', headers={'Accept-Encoding': 'gzip'})
+    etag = gzipped.headers['ETag']
+    cached = client.get('/api/examples', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    other = client.get('/api/examples', headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+    assert other.status_code == 200
+    assert other.get_json()['success'] is True
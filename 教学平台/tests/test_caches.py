@@ -0,0 +1,49 @@
+"""各个LRU缓存"""
+
+from app import LRUCache, ResultCache
+
+
+def test_lru_evicts_least_recently_used_entries():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats() == {'entries': 2, 'hits': 3, 'misses': 1}
+
+
+def test_lru_counts_sizes_and_skips_oversized_entries():
+    cache = LRUCache(10, len)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'yyyy')
+    cache.put('a', 'xxxxxx')  # 替换时扣除旧条目的大小
+    assert cache.size == 10
+    cache.put('c', 'z')
+    assert cache.get('b') is None
+    assert cache.size == 7
+    cache.put('big', 'x' * 11)
+    assert cache.get('big') is None
+    assert cache.size == 7
+
+
+def test_lru_drops_invalid_entries():
+    cache = LRUCache(10, len)
+    cache.put('a', 'v1')
+    assert cache.get('a', lambda value: value == 'v2') is None
+    assert cache.size == 0
+    assert cache.get('a') is None
+
+
+def test_result_cache_expires_entries(monkeypatch):
+    import app
+    now = [100.0]
+    monkeypatch.setattr(app.time, 'monotonic', lambda: now[0])
+    cache = ResultCache(10, ttl=5)
+    cache.put('print(1)', '', '1\n')
+    assert cache.get('print(1)', '') == '1\n'
+    assert cache.get('print(1)', 'other input') is None
+    now[0] += 6
+    assert cache.get('print(1)', '') is None
+    assert cache.stats()['entries'] == 0
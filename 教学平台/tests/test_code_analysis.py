@@ -0,0 +1,23 @@
+"""代码分析"""
+
+import pytest
+
+from app import AIAssistant
+
+
+def test_syntax_error_reports_line_number():
+    assert AIAssistant.measure_code('x = 1\ny = (\n')['syntax_error'].startswith('第2行: ')
+
+
+@pytest.mark.parametrize('code', ['x = 1\x00', 'x=' + '-' * 200000 + '1'])
+def test_unparsable_code_without_line_number(code):
+    error = AIAssistant.measure_code(code)['syntax_error']
+    assert error
+    assert 'None' not in error
+
+
+def test_analysis_scores_simple_code():
+    analysis = AIAssistant.build_analysis('# 打印问候\nname = "Python"\nprint(f"Hello, {name}")\n')
+    assert analysis['metrics']['print_calls'] == 1
+    assert analysis['metrics']['comment_lines'] == 1
+    assert analysis['score'] == 100
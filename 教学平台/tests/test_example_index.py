@@ -0,0 +1,45 @@
+"""教材代码示例索引"""
+
+import pytest
+
+import example_index as module
+from example_index import ExampleIndex
+
+BOOK = '第一册-测试'
+
+
+@pytest.fixture
+def chapter(tmp_path):
+    book = tmp_path / BOOK
+    book.mkdir()
+    path = book / '第1章-变量.md'
+    path.write_text('# 第1章 变量\n\n## 赋值\n\n示例：\n\n```python\nx = 1\nprint(x)\n```\n', encoding='utf-8')
+    return path
+
+
+def test_page_and_get(tmp_path, chapter):
+    index = ExampleIndex(str(tmp_path / 'examples.json'), str(tmp_path), [BOOK])
+    page = index.page(1)
+    assert page['total'] == 1
+    example = page['examples'][0]
+    assert example['code'] == 'x = 1\nprint(x)\n'
+    assert example['section'] == '赋值'
+    assert index.get(example['id'])['code'] == example['code']
+
+
+def test_refresh_is_throttled(tmp_path, chapter, monkeypatch):
+    index = ExampleIndex(str(tmp_path / 'examples.json'), str(tmp_path), [BOOK], check_interval=60)
+    calls = []
+    listing = module.chapter_files
+    monkeypatch.setattr(module, 'chapter_files', lambda *args: calls.append(1) or listing(*args))
+
+    assert index.refresh() == 1
+    index.page()
+    index.version()
+    index.get('missing')
+    assert len(calls) == 1  # 间隔内不再列目录
+
+    chapter.write_text(chapter.read_text(encoding='utf-8') + '\n```python\nprint(2)\n```\n', encoding='utf-8')
+    assert index.page()['total'] == 1
+    assert index.refresh(force=True) == 1
+    assert index.page()['total'] == 2
@@ -0,0 +1,73 @@
+"""学习进度存储的后端接口、连接管理和后台写入"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from progress_store import MemoryBackend, ProgressBackend, ProgressStore, SQLiteBackend
+
+
+def test_backend_must_implement_interface():
+    class Incomplete(ProgressBackend):
+        def load(self, user_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_close_closes_connections_of_all_threads(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'progress.db'))
+    backend.save_many({'u1': {'chapter': 1}})
+    connections = []
+    ready = threading.Event()
+    done = threading.Event()
+
+    def reader():
+        assert backend.load('u1') == {'chapter': 1}
+        connections.append(backend._local.conn)
+        ready.set()
+        done.wait(5)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    ready.wait(5)
+    main_conn = backend._local.conn
+    backend.close()
+    done.set()
+    thread.join()
+    for conn in connections + [main_conn]:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+
+
+def test_connections_of_finished_threads_are_released(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'progress.db'))
+    for _ in range(5):
+        thread = threading.Thread(target=backend.load, args=('u1',))
+        thread.start()
+        thread.join()
+    # 新线程创建连接时关闭已结束线程的连接，只剩主线程和最后一个线程的
+    assert len(backend._connections) == 2
+    backend.close()
+
+
+def test_flush_errors_are_logged(caplog):
+    class FailingBackend(MemoryBackend):
+        def save_many(self, items):
+            raise OSError('disk full')
+
+    store = ProgressStore(FailingBackend(), flush_interval=0.01)
+    with caplog.at_level(logging.ERROR, logger='progress_store'):
+        store.update('u1', {'chapter': 2})
+        deadline = time.monotonic() + 2
+        while not caplog.records and time.monotonic() < deadline:
+            time.sleep(0.01)
+    store._closed = True
+    store._wakeup.set()
+    store._thread.join(1)
+    assert any('保存学习进度失败' in record.getMessage() and record.exc_info for record in caplog.records)
+    assert store.stats()['pending'] == 1
@@ -0,0 +1,75 @@
+"""沙箱进程池的回归测试"""
+
+import pytest
+
+import app
+from app import CodeExecutor, SandboxWorkerPool
+
+
+def job(code):
+    return {'bytecode': CodeExecutor.compile_code(code)['bytecode'], 'input': ''}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # 每次执行后都回收工作进程
+    monkeypatch.setattr(app, 'MAX_JOBS_PER_WORKER', 1)
+    pool = SandboxWorkerPool(1)
+    yield pool
+    pool.shutdown()
+
+
+def test_recycled_worker_does_not_inherit_exception_context(pool):
+    for _ in range(3):
+        result = pool.run(job('print(1/0)'))
+        assert result['status'] == 'error'
+        assert 'ZeroDivisionError' in result['message']
+        assert 'GeneratorExit' not in result['message']
+
+
+def test_pool_keeps_running_after_recycling(pool):
+    for index in range(5):
+        result = pool.run(job(f'print({index})'))
+        assert result['status'] == 'ok'
+        assert result['stdout'] == f'{index}\n'
+    assert len(pool._workers) == 1
+
+
+def test_abandoned_stream_recycles_worker(pool):
+    stream = pool.stream(dict(job('for i in range(3):\n    print(i)'), stream=True))
+    assert next(stream)['status'] == 'chunk'
+    stream.close()
+    assert pool.run(job('print("ok")'))['stdout'] == 'ok\n'
+
+
+def test_spawner_retries_after_fork_failure(pool, monkeypatch):
+    real_worker = app.SandboxWorker
+    failures = []
+
+    def flaky_worker(context):
+        if len(failures) < 2:
+            failures.append(1)
+            raise OSError(11, 'Resource temporarily unavailable')
+        return real_worker(context)
+
+    monkeypatch.setattr(app, 'SandboxWorker', flaky_worker)
+    monkeypatch.setattr(app, 'SPAWN_RETRY_DELAY', 0.01)
+    for index in range(3):
+        assert pool.run(job(f'print({index})'))['stdout'] == f'{index}\n'
+    assert len(failures) == 2
+
+
+def test_run_returns_error_when_no_worker_becomes_available(monkeypatch):
+    def failing_worker(context):
+        raise OSError(12, 'Cannot allocate memory')
+
+    monkeypatch.setattr(app, 'SandboxWorker', failing_worker)
+    monkeypatch.setattr(app, 'SPAWN_RETRY_DELAY', 0.01)
+    monkeypatch.setattr(app, 'SANDBOX_ACQUIRE_TIMEOUT', 0.2)
+    pool = SandboxWorkerPool(1)
+    try:
+        result = pool.run(job('print(1)'))
+    finally:
+        pool.shutdown()
+    assert result['status'] == 'error'
+    assert '没有可用的沙箱进程' in result['message']
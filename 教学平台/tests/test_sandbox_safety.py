@@ -0,0 +1,114 @@
+"""沙箱安全检查的回归测试"""
+
+import pytest
+
+from app import CodeExecutor
+
+ESCAPES = [
+    'import random\nprint(random._os.getcwd())',
+    'import collections\nprint(collections._sys.version)',
+    'print(random._os.system("id"))',
+    'from random import _os',
+    'print(getattr(random, "_os"))',
+    'print(getattr(random, "_" + "os"))',
+    'setattr(random, "_inst", None)',
+    'print("{0._os}".format(random))',
+    'print(random.choice.__self__)',
+    'print(().__class__.__bases__[0].__subclasses__())',
+    'print((lambda: 0).__globals__)',
+    'import operator\nprint(operator.attrgetter("_os")(random))',
+    'from operator import attrgetter',
+    'import string\nprint(string.Formatter().get_field("0._os", [random], {}))',
+    'import os',
+    'open("/etc/passwd")',
+    'print(json.codecs.open("/etc/hostname").read())',
+    'print(json.codecs.sys.modules["os"].getcwd())',
+    'json.codecs.builtins.eval("1+1")',
+    'print(datetime.sys.modules["os"].getcwd())',
+    'from json import codecs',
+    'print(getattr(json, "codecs"))',
+    'print(getattr(getattr(json, "decoder"), "re").sys)',
+    'print("{0.__globals__}".format(print))',
+    'print("{0:{1.__class__}}".format(1, 2))',
+]
+
+
+def run(code):
+    """先做静态检查，通过后在当前进程中执行"""
+    is_safe, message = CodeExecutor.check_code_safety(code)
+    if not is_safe:
+        return 'rejected', message
+    result = CodeExecutor.run_sandboxed(code)
+    return result['status'], result['message']
+
+
+@pytest.mark.parametrize('code', ESCAPES)
+def test_escapes_are_blocked(code):
+    status, message = run(code)
+    assert status != 'ok', message
+
+
+@pytest.mark.parametrize('name', ['__globals__', '__subclasses__', 'mro', 'attrgetter', 'codecs', 'sys'])
+def test_safe_attribute_helpers_reject_dangerous_names(name):
+    import random
+    for helper, args in ((CodeExecutor.safe_getattr, ()), (CodeExecutor.safe_hasattr, ()),
+                         (CodeExecutor.safe_setattr, (None,))):
+        with pytest.raises(AttributeError):
+            helper(random, name, *args)
+
+
+@pytest.mark.parametrize('code,expected', [
+    ('import math\nprint(math.sqrt(16))', '4.0\n'),
+    ('print(getattr(str, "upper")("ab"))', 'AB\n'),
+    ('import math\nprint(math.sqrt.__name__)', 'sqrt\n'),
+    ('print("{0.real}".format(3))', '3\n'),
+    ('from collections import Counter\nprint(Counter("aab").most_common(1))', "[('a', 2)]\n"),
+    ('print("a._b")', 'a._b\n'),
+    ('print("__main__")', '__main__\n'),
+    ('from collections import namedtuple\nP = namedtuple("P", "x y")\nprint(P(1, 2)._asdict())', "{'x': 1, 'y': 2}\n"),
+    ('print(hasattr(random, "_os"))', 'False\n'),
+    ('print(json.decoder.JSONDecodeError.__name__)', 'JSONDecodeError\n'),
+    ('import re\nprint(re.compile("a+").findall("caab"))', "['aa']\n"),
+])
+def test_ordinary_code_still_runs(code, expected):
+    is_safe, message = CodeExecutor.check_code_safety(code)
+    assert is_safe, message
+    result = CodeExecutor.run_sandboxed(code)
+    assert result['status'] == 'ok', result['message']
+    assert result['stdout'] == expected
+
+
+@pytest.mark.parametrize('code', [
+    'x=' + '-' * 200000 + '1',
+    'x = ' + '+'.join(['1'] * 300000),
+    'x = ' + '(' * 100000 + ')' * 100000,
+])
+def test_pathological_sources_fail_to_compile_and_are_cached(code):
+    from app import CompiledCodeCache
+    cache = CompiledCodeCache(1024 * 1024)
+    entry = cache.get(code)
+    assert entry['ok'] is False
+    assert entry['message'].startswith('执行错误')
+    assert cache.get(code) is entry
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('code', [
+    'math.sqrt = lambda x: 42',
+    'import math\nmath.sqrt = lambda x: 42',
+    'from math import sqrt\nimport math as m\nm.sqrt = lambda x: 42',
+    'import json\njson.dumps = lambda *a, **k: "pwned"',
+    'json.decoder.JSONDecoder = None',
+])
+def test_module_changes_do_not_leak_into_later_runs(code):
+    import json
+    import math
+    # 与工作进程相同：模块只导入一次，多次执行共用
+    modules = CodeExecutor.load_sandbox_modules()
+    assert CodeExecutor.run_sandboxed(code, modules=modules)['status'] == 'ok'
+    result = CodeExecutor.run_sandboxed(
+        'import math\nprint(math.sqrt(16), json.dumps(1), json.decoder.JSONDecoder.__name__)', modules=modules
+    )
+    assert result['stdout'] == '4.0 1 JSONDecoder\n'
+    assert math.sqrt(16) == 4.0
+    assert json.dumps(1) == '1'
@@ -0,0 +1,40 @@
+"""章节全文检索索引"""
+
+import pytest
+
+from search_index import SearchIndex
+
+BOOK = '第一册-测试'
+
+
+@pytest.fixture
+def index(tmp_path):
+    book = tmp_path / BOOK
+    book.mkdir()
+    (book / '第1章-变量.md').write_text(
+        '# 第1章 变量\n\n## 变量赋值\n\n变量赋值使用等号。\n\n## 列表推导式\n\n列表推导式很简洁。\n',
+        encoding='utf-8'
+    )
+    index = SearchIndex(str(tmp_path / 'search.idx'), str(tmp_path), [BOOK])
+    index.update()
+    return index
+
+
+def test_search_finds_section(index):
+    results = index.search('推导式')
+    assert [result['section'] for result in results] == ['列表推导式']
+    assert results[0]['chapter_id'] == 1
+    assert '推导式' in results[0]['snippet']
+
+
+def test_results_survive_concurrent_update(index, monkeypatch):
+    """锁外生成结果时索引被update()替换，仍然返回检索时那一版的小节"""
+    original = index._result
+
+    def result_after_update(*args):
+        index._close()  # update()中_write会先关闭旧索引并清空docs和files
+        return original(*args)
+
+    monkeypatch.setattr(index, '_result', result_after_update)
+    results = index.search('推导式')
+    assert [result['section'] for result in results] == ['列表推导式']
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Markdown转Notebook转换器的性能测试
+
+功能:
+1. 使用三册书的全部章节，以及把这些章节复制10倍、100倍得到的合成语料
+2. 分阶段计时：解析、代码块提取、练习题和项目提取、notebook生成、写入磁盘
+3. 统计每秒生成的notebook数，用tracemalloc测量峰值内存
+4. 结果可以保存为JSON，用于对比不同版本的性能
+
+命令行用法:
+    python benchmark_converter.py                          # 原书、10倍、100倍三组语料（单核约需数分钟）
+    python benchmark_converter.py --scales 1,10 --repeat 5 --output bench.json
+    python benchmark_converter.py --no-validate            # 不做schema校验
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import nbformat
+
+from md_to_notebook import CONVERTER_VERSION, DirectoryOutput, MarkdownToNotebook
+
+CHAPTER_NUMBER = re.compile(r'第(\d+)章-')
+STAGES = ('parse', 'code_extraction', 'exercise_extraction', 'notebook_build', 'write')
+
+
+def load_books(root: Path) -> List[Tuple[str, str]]:
+    """读取各册书目录（第*册-*）中的全部章节，按章节号排序，返回 [(文件名, 内容)]"""
+    chapter_files = sorted(root.glob("第*册-*/第*章-*.md"),
+                           key=lambda path: int(CHAPTER_NUMBER.match(path.name).group(1)))
+    return [(chapter_file.name, chapter_file.read_text(encoding='utf-8')) for chapter_file in chapter_files]
+
+
+def scale_corpus(chapters: List[Tuple[str, str]], scale: int) -> List[Tuple[str, str]]:
+    """把全部章节复制scale份，重新编号为第1章到第N章，模拟多门课程或多个版本一起构建"""
+    scaled = []
+    for _ in range(scale):
+        for name, content in chapters:
+            title = name.split('-', 1)[1]
+            scaled.append((f"第{len(scaled) + 1}章-{title}", content))
+    return scaled
+
+
+class TimedFile:
+    """累计写入耗时的文件包装"""
+
+    def __init__(self, f, output: 'TimedOutput'):
+        self.f = f
+        self.output = output
+
+    def write(self, text: str) -> int:
+        started = time.perf_counter()
+        written = self.f.write(text)
+        self.output.seconds += time.perf_counter() - started
+        return written
+
+
+class TimedOutput:
+    """包装输出目标，累计打开、写入和关闭文件所花的时间"""
+
+    def __init__(self, output):
+        self.output = output
+        self.seconds = 0.0
+
+    @contextmanager
+    def open(self, name: str):
+        clock = time.perf_counter
+        started = clock()
+        with self.output.open(name) as f:
+            self.seconds += clock() - started
+            yield TimedFile(f, self)
+            started = clock()
+        self.seconds += clock() - started
+
+    def discard(self, name: str):
+        started = time.perf_counter()
+        self.output.discard(name)
+        self.seconds += time.perf_counter() - started
+
+
+def convert(converter: MarkdownToNotebook, chapters: List[Tuple[str, str]], output_dir: Path) -> Dict:
+    """用 convert_chapter 把全部章节转换到output_dir，返回各阶段耗时（秒）和生成的文件数
+
+    parse、code_extraction、exercise_extraction、notebook_build 由 convert_chapter 计时；
+    notebook边生成边写出，写入磁盘的时间从 notebook_build 中扣除，单独记为 write。
+    """
+    timings = dict.fromkeys(STAGES, 0.0)
+    output = TimedOutput(DirectoryOutput(output_dir))
+    notebooks = 0
+    files = 0
+    for name, content in chapters:
+        outputs = converter.convert_chapter(Path(name), content, output, timings)
+        notebooks += sum(1 for file_name in outputs if file_name.endswith('.ipynb'))
+        files += len(outputs)
+    timings['notebook_build'] -= output.seconds
+    timings['write'] = output.seconds
+    return {'timings': timings, 'notebooks': notebooks, 'files': files}
+
+
+def run_corpus(name: str, chapters: List[Tuple[str, str]], validate: bool, repeat: int) -> Dict:
+    """测试一组语料：各阶段取repeat次中的最小值，另外单独运行一次测量峰值内存"""
+    if repeat < 1:
+        raise ValueError('repeat必须大于等于1')
+    converter = MarkdownToNotebook('.', None, validate)
+    best = dict.fromkeys(STAGES, float('inf'))
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix='nb-bench-') as output_dir:
+            result = convert(converter, chapters, Path(output_dir))
+        for stage, seconds in result['timings'].items():
+            best[stage] = min(best[stage], seconds)
+
+    # tracemalloc会明显拖慢运行，不和计时放在同一次
+    with tempfile.TemporaryDirectory(prefix='nb-bench-') as output_dir:
+        tracemalloc.start()
+        convert(converter, chapters, Path(output_dir))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    total = sum(best.values())
+    return {
+        'name': name,
+        'chapters': len(chapters),
+        'source_bytes': sum(len(content.encode('utf-8')) for _, content in chapters),
+        'notebooks': result['notebooks'],
+        'files': result['files'],
+        'stages_ms': {stage: round(seconds * 1000, 2) for stage, seconds in best.items()},
+        'total_ms': round(total * 1000, 2),
+        'notebooks_per_second': round(result['notebooks'] / total, 1) if total else None,
+        'peak_memory_bytes': peak
+    }
+
+
+def print_report(corpora: List[Dict]):
+    header = f"{'语料':<10}{'章节':>7}{'notebook':>10}" + ''.join(f"{stage:>21}" for stage in STAGES)
+    print(header + f"{'总计(ms)':>12}{'nb/s':>10}{'峰值内存(MB)':>14}")
+    for corpus in corpora:
+        stages = ''.join(f"{corpus['stages_ms'][stage]:>21.1f}" for stage in STAGES)
+        print(f"{corpus['name']:<10}{corpus['chapters']:>7}{corpus['notebooks']:>10}{stages}"
+              f"{corpus['total_ms']:>12.1f}{corpus['notebooks_per_second']:>10.1f}"
+              f"{corpus['peak_memory_bytes'] / 1024 / 1024:>14.1f}")
+
+
+def positive_int(value: str) -> int:
+    """命令行参数：大于等于1的整数"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必须大于等于1: {value}")
+    return number
+
+
+def main():
+    """主函数"""
+    default_root = Path(__file__).resolve().parents[3]
+    parser = argparse.ArgumentParser(description='测试Markdown转Notebook转换器的性能')
+    parser.add_argument('--root', default=str(default_root), help='包含三册书目录的仓库根目录')
+    parser.add_argument('--scales', default='1,10,100', help='语料倍数，逗号分隔，1为原书')
+    parser.add_argument('--repeat', type=positive_int, default=3, help='每组语料重复次数（至少1次），各阶段取最小值')
+    parser.add_argument('--no-validate', action='store_true', help='不按nbformat的schema校验生成的单元格')
+    parser.add_argument('--output', help='把结果保存为JSON文件')
+    args = parser.parse_args()
+
+    books = load_books(Path(args.root))
+    if not books:
+        raise SystemExit(f"在 {args.root} 中没有找到章节文件")
+
+    corpora = []
+    try:
+        scales = [positive_int(value) for value in args.scales.split(',')]
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(f"--scales: {e}")
+
+    for scale in scales:
+        name = 'books' if scale == 1 else f'books-x{scale}'
+        print(f"测试 {name} ...", file=sys.stderr)
+        corpora.append(run_corpus(name, scale_corpus(books, scale), not args.no_validate, args.repeat))
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'converter_version': CONVERTER_VERSION,
+        'python': platform.python_version(),
+        'nbformat': nbformat.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'validate': not args.no_validate,
+        'repeat': args.repeat,
+        'corpora': corpora
+    }
+    print_report(corpora)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,63 +7,395 @@ Markdown to Jupyter Notebook Converter for Python教程
 2. 提取代码块和练习题
 3. 生成nbgrader格式的Jupyter Notebook
 4. 设置自动评分点和测试用例
+5. 通过构建清单增量构建，只重新转换内容有变化的章节
+6. 逐个单元格流式写出notebook，可以输出到目录、内存或zip压缩包
 """
 
+import io
 import re
 import json
+import hashlib
+import time
+import zipfile
+from json.encoder import encode_basestring as encode_json_string
 import nbformat
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import yaml
-from nbformat.v4 import new_notebook, new_markdown_cell, new_code_cell
+from nbformat.v4.nbbase import nbformat as NBFORMAT_VERSION, nbformat_minor as NBFORMAT_MINOR, random_cell_id
+
+# 转换逻辑变化时修改版本号，已有的构建结果会全部重新生成
+CONVERTER_VERSION = '1.1'
+MANIFEST_NAME = 'build-manifest.json'
+CODE_FENCE_OPEN = len('```python\n')
+CODE_FENCE_CLOSE = len('\n```')
+
+
+def add_timing(timings: Dict[str, float], stage: str, seconds: float):
+    """把一个阶段的耗时累加到timings中"""
+    timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class DocumentMarkers:
+    """扫描一遍得到的标记位置：每一串连续的 #（至少两个）和每个 ```python 开始标记
+    
+    小节、代码块、练习题和项目的范围都由这些位置确定，不必对全文分别做正则匹配。
+    """
+    
+    # 写成 ##+ 而不是 #{2,}，正则引擎可以按字面前缀快速查找
+    hash_pattern = re.compile(r'##+')
+    opener_pattern = re.compile(r'```python\n')
+    
+    def __init__(self, content: str):
+        self.content = content
+        self.runs = [match.span() for match in self.hash_pattern.finditer(content)]  # (起, 止)
+        self.openers = [match.start() for match in self.opener_pattern.finditer(content)]
+        self.run_starts = [start for start, _ in self.runs]
+        self.long_runs = [(start, end) for start, end in self.runs if end - start >= 3]
+        self.long_run_starts = [start for start, _ in self.long_runs]
+        # 与非多行模式的 $ 一致：匹配结尾，或结尾的换行符之前
+        self.text_end = len(content) - 1 if content.endswith('\n') else len(content)
+    
+    def next_hashes(self, position: int, width: int = 2) -> int:
+        """position及之后第一个连续width个 # 的位置，没有时返回文本结尾"""
+        runs, starts = (self.runs, self.run_starts) if width == 2 else (self.long_runs, self.long_run_starts)
+        i = bisect_right(starts, position) - 1
+        if i >= 0 and runs[i][1] - position >= width:
+            return position
+        if i + 1 < len(runs):
+            return runs[i + 1][0]
+        return max(self.text_end, position)
+    
+    def openers_between(self, start: int, end: int) -> List[int]:
+        """完整位于 content[start:end] 内的 ```python 开始标记"""
+        return self.openers[bisect_left(self.openers, start):bisect_right(self.openers, end - CODE_FENCE_OPEN)]
+    
+    def headings(self) -> List[Tuple[int, str]]:
+        """行首的二级标题，返回 (位置, 标题) 列表"""
+        content = self.content
+        headings = []
+        for start, end in self.runs:
+            if end - start != 2 or (start > 0 and content[start - 1] != '\n'):
+                continue
+            if content[end:end + 1] != ' ' or content[end + 1:end + 2] in ('', '\n'):
+                continue
+            line_end = content.find('\n', end)
+            headings.append((start, content[end + 1:line_end if line_end >= 0 else len(content)]))
+        return headings
+
+
+class NotebookWriter:
+    """逐个单元格写出notebook
+    
+    输出与 nbformat.write 相同（键排序、缩进1、source按行拆分），但不在内存中构造整个notebook。
+    validate为True时按nbformat的schema逐个校验单元格，为False时跳过校验。
+    """
+    
+    def __init__(self, fp, validate: bool = True):
+        self.fp = fp
+        self.validate = validate
+        self.cells = 0
+        fp.write('{\n "cells": [')
+    
+    def add_markdown(self, source: str):
+        self._add({'cell_type': 'markdown', 'id': random_cell_id(), 'metadata': {}, 'source': source})
+    
+    def add_code(self, source: str, metadata: Dict = None):
+        self._add({'cell_type': 'code', 'execution_count': None, 'id': random_cell_id(),
+                   'metadata': metadata or {}, 'outputs': [], 'source': source})
+    
+    def _add(self, cell: Dict):
+        if self.validate:
+            nbformat.validate(cell, ref=f"{cell['cell_type']}_cell", version=NBFORMAT_VERSION)
+        # 带缩进的json.dumps只有纯Python实现，对整个单元格调用很慢，这里只对metadata使用，
+        # source的每一行和其他简单的值用C实现的编码函数
+        fields = []
+        for key in sorted(cell):
+            value = cell[key]
+            if key == 'source':
+                lines = value.splitlines(True)
+                text = '[\n    ' + ',\n    '.join(map(encode_json_string, lines)) + '\n   ]' if lines else '[]'
+            elif key == 'metadata':
+                text = json.dumps(value, ensure_ascii=False, indent=1, sort_keys=True).replace('\n', '\n   ')
+            else:
+                text = json.dumps(value, ensure_ascii=False)
+            fields.append(f'"{key}": {text}')
+        # 单元格位于第二层，前面缩进两个空格
+        self.fp.write((',\n  {\n   ' if self.cells else '\n  {\n   ') + ',\n   '.join(fields) + '\n  }')
+        self.cells += 1
+    
+    def finish(self):
+        """写出notebook的其余部分"""
+        self.fp.write('\n ],\n' if self.cells else '],\n')
+        self.fp.write(f' "metadata": {{}},\n "nbformat": {NBFORMAT_VERSION},\n "nbformat_minor": {NBFORMAT_MINOR}\n}}\n')
+
+
+class DirectoryOutput:
+    """把生成的文件写到目录中"""
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+    
+    @contextmanager
+    def open(self, name: str):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            yield f
+    
+    def discard(self, name: str):
+        """删除上次构建留下、这次不再生成的文件"""
+        path = self.root / name
+        if path.exists():
+            path.unlink()
+
+
+class MemoryOutput:
+    """把生成的文件保存在 files 字典中 {相对路径: 内容}，供网页接口等直接使用"""
+    
+    def __init__(self):
+        self.files: Dict[str, str] = {}
+    
+    @contextmanager
+    def open(self, name: str):
+        buffer = io.StringIO()
+        yield buffer
+        self.files[name] = buffer.getvalue()
+    
+    def discard(self, name: str):
+        self.files.pop(name, None)
+
+
+class ZipOutput:
+    """把生成的文件写入一个zip压缩包，用作上下文管理器"""
+    
+    def __init__(self, path: str):
+        self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+    
+    @contextmanager
+    def open(self, name: str):
+        with io.TextIOWrapper(self.archive.open(name, 'w'), encoding='utf-8') as f:
+            yield f
+    
+    def discard(self, name: str):
+        pass  # 压缩包每次重新生成，不会有旧文件
+    
+    def close(self):
+        self.archive.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
 
 class MarkdownToNotebook:
     """Markdown文件转换为Jupyter Notebook的转换器"""
     
-    def __init__(self, source_dir: str, output_dir: str):
+    def __init__(self, source_dir: str, output_dir: Optional[str], validate: bool = True):
         self.source_dir = Path(source_dir)
-        self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # 只输出到内存或压缩包时output_dir为None，不创建输出目录
+        self.output_dir = Path(output_dir) if output_dir is not None else None
+        self.directory_output = None
+        if self.output_dir is not None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self.directory_output = DirectoryOutput(self.output_dir)
+        self.validate = validate  # 是否按schema校验生成的单元格
         
         # 正则表达式模式
-        self.code_pattern = re.compile(r'```python\n(.*?)\n```', re.DOTALL)
-        self.exercise_pattern = re.compile(r'### 练习题?\s*(\d+)[:：]\s*(.*?)\n(.*?)(?=###|$)', re.DOTALL)
-        self.project_pattern = re.compile(r'## 综合项目[:：]\s*(.*?)\n(.*?)(?=##|$)', re.DOTALL)
-        
-    def convert_all_chapters(self):
-        """转换所有章节"""
+        self.description_pattern = re.compile(r'(?:示例|例子|代码)[:：]?\s*(.+?)(?=\n|$)')
+        # 练习题和项目只匹配标题部分，正文到下一个 ### 或 ## 为止
+        self.exercise_pattern = re.compile(r'### 练习题?\s*(\d+)[:：]\s*(.*?)\n', re.DOTALL)
+        self.project_pattern = re.compile(r'## 综合项目[:：]\s*(.*?)\n', re.DOTALL)
+        
+    def convert_all_chapters(self, force: bool = False, jobs: int = 1) -> Dict:
+        """转换所有章节
+        
+        构建清单记录每个章节的源文件哈希和生成的文件，源文件未修改的章节直接跳过，
+        已删除章节和不再生成的文件会被清理。force为True时全部重新转换。
+        jobs大于1时用多个进程并行转换，输出和清单的顺序与串行转换相同。
+        单个章节转换失败不影响其他章节，失败的章节记录在返回结果的failed中。
+        """
         chapter_files = sorted(self.source_dir.glob("第*章-*.md"))
+        old_chapters = self.load_manifest().get('chapters', {})
+        chapters = {}
+        pending = []
+        summary = {'built': [], 'skipped': [], 'removed': [], 'failed': []}
         
         for chapter_file in chapter_files:
+            stat = chapter_file.stat()
+            old = old_chapters.get(chapter_file.name)
+            
+            # 修改时间和大小都没变时不必重新计算哈希
+            if old and old['mtime'] == stat.st_mtime_ns and old['size'] == stat.st_size:
+                source_hash = old['hash']
+            else:
+                source_hash = hashlib.sha256(chapter_file.read_bytes()).hexdigest()
+            
+            if not force and old and old['hash'] == source_hash and self.outputs_exist(old['outputs']):
+                chapters[chapter_file.name] = dict(old, mtime=stat.st_mtime_ns, size=stat.st_size)
+                summary['skipped'].append(chapter_file.name)
+            else:
+                pending.append((chapter_file, source_hash, stat))
+        
+        results = self.run_conversions([chapter_file for chapter_file, _, _ in pending], jobs)
+        for chapter_file, source_hash, stat in pending:
             print(f"转换章节: {chapter_file.name}")
-            self.convert_chapter(chapter_file)
+            outputs, error = results[chapter_file.name]
+            if error is not None:
+                summary['failed'].append({'chapter': chapter_file.name, 'error': error})
+                # 保留上次成功的记录，下次构建时哈希不一致会再次尝试
+                if chapter_file.name in old_chapters:
+                    chapters[chapter_file.name] = old_chapters[chapter_file.name]
+                continue
+            chapters[chapter_file.name] = {
+                'hash': source_hash,
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'outputs': outputs
+            }
+            summary['built'].append(chapter_file.name)
+        
+        # 清理已删除章节的输出和章节不再生成的文件
+        current_outputs = {output for chapter in chapters.values() for output in chapter['outputs']}
+        for chapter in old_chapters.values():
+            for output in chapter['outputs']:
+                if output not in current_outputs:
+                    self.remove_output(output)
+                    summary['removed'].append(output)
+        
+        self.save_manifest({'converter_version': CONVERTER_VERSION, 'chapters': chapters})
+        return summary
+    
+    def run_conversions(self, chapter_files: List[Path], jobs: int = 1) -> Dict[str, Tuple]:
+        """转换多个章节，返回 {文件名: (生成的文件, 错误信息)}"""
+        results = {}
+        if jobs <= 1 or len(chapter_files) <= 1:
+            for chapter_file in chapter_files:
+                results[chapter_file.name] = _convert_chapter_safely(self, chapter_file)
+            return results
+        
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(str(self.source_dir), str(self.output_dir), self.validate)) as executor:
+            futures = {executor.submit(_convert_in_worker, str(chapter_file)): chapter_file.name
+                       for chapter_file in chapter_files}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:  # 工作进程异常退出等
+                    results[futures[future]] = ([], f"{type(e).__name__}: {e}")
+        return results
+    
+    def export_all(self, output) -> Dict:
+        """把全部章节转换到指定的输出目标（MemoryOutput、ZipOutput等），不使用构建清单"""
+        summary = {'built': [], 'failed': [], 'files': []}
+        for chapter_file in sorted(self.source_dir.glob("第*章-*.md")):
+            outputs, error = _convert_chapter_safely(self, chapter_file, output)
+            if error is not None:
+                summary['failed'].append({'chapter': chapter_file.name, 'error': error})
+                continue
+            summary['built'].append(chapter_file.name)
+            summary['files'].extend(outputs)
+        return summary
+    
+    def load_manifest(self) -> Dict:
+        """读取构建清单，转换器版本不同时视为没有清单"""
+        try:
+            manifest = json.loads((self.output_dir / MANIFEST_NAME).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('converter_version') != CONVERTER_VERSION:
+            return {}
+        return manifest
+    
+    def save_manifest(self, manifest: Dict):
+        """先写临时文件再替换，避免中断时留下不完整的清单"""
+        manifest_file = self.output_dir / MANIFEST_NAME
+        tmp_file = manifest_file.with_suffix('.tmp')
+        tmp_file.write_text(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True), encoding='utf-8')
+        tmp_file.replace(manifest_file)
+    
+    def outputs_exist(self, outputs: List[str]) -> bool:
+        return all((self.output_dir / output).exists() for output in outputs)
+    
+    def remove_output(self, output: str):
+        """删除一个生成的文件，目录为空时一并删除"""
+        output_file = self.output_dir / output
+        if output_file.exists():
+            output_file.unlink()
+        try:
+            output_file.parent.rmdir()
+        except OSError:
+            pass
             
-    def convert_chapter(self, chapter_file: Path):
-        """转换单个章节"""
+    def convert_chapter(self, chapter_file: Path, content: str = None, output=None,
+                        timings: Dict[str, float] = None) -> List[str]:
+        """转换单个章节，返回生成的文件（相对输出目录的路径）
+        
+        output为输出目标，默认写到输出目录。
+        提供timings字典时，把各阶段的耗时（秒）累加到其中，见 parse_chapter；
+        生成notebook和配置文件（含写入输出目标）的耗时记为 notebook_build。
+        """
+        output = output or self.directory_output
         # 读取Markdown内容
-        content = chapter_file.read_text(encoding='utf-8')
-        
-        # 解析章节信息
-        chapter_info = self.parse_chapter_info(chapter_file.name, content)
-        
-        # 创建输出目录
-        chapter_dir = self.output_dir / f"chapter-{chapter_info['number']:02d}"
-        chapter_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 生成主要内容notebook
-        self.create_content_notebook(content, chapter_info, chapter_dir)
-        
-        # 生成练习题notebook
-        self.create_exercises_notebook(content, chapter_info, chapter_dir)
-        
-        # 生成项目案例notebook
-        self.create_project_notebook(content, chapter_info, chapter_dir)
-        
-        # 生成配置文件
-        self.create_nbgrader_config(chapter_info, chapter_dir)
-        
-    def parse_chapter_info(self, filename: str, content: str) -> Dict:
+        if content is None:
+            content = chapter_file.read_text(encoding='utf-8')
+        
+        # 解析章节，三个notebook都从同一个文档模型生成
+        document = self.parse_chapter(chapter_file.name, content, timings)
+        chapter_info = document['info']
+        started = time.perf_counter()
+        
+        # 章节目录
+        chapter_dir = f"chapter-{chapter_info['number']:02d}"
+        
+        outputs = [
+            # 生成主要内容notebook
+            self.create_content_notebook(document, output, chapter_dir),
+            # 生成练习题notebook
+            self.create_exercises_notebook(document, output, chapter_dir),
+            # 生成项目案例notebook
+            self.create_project_notebook(document, output, chapter_dir),
+            # 生成配置文件
+            self.create_nbgrader_config(chapter_info, output, chapter_dir)
+        ]
+        
+        # 练习题或项目为空时不生成对应文件，清理上次构建留下的旧文件
+        for kind in ('exercises', 'project'):
+            stale_file = f"{chapter_dir}/{chapter_info['number']:02d}-{kind}.ipynb"
+            if stale_file not in outputs:
+                output.discard(stale_file)
+        
+        if timings is not None:
+            add_timing(timings, 'notebook_build', time.perf_counter() - started)
+        return [name for name in outputs if name is not None]
+        
+    def parse_chapter(self, filename: str, content: str, timings: Dict[str, float] = None) -> Dict:
+        """解析章节，返回文档模型
+        
+        只扫描一遍内容，得到章节信息、按二级标题划分的小节和代码块、练习题以及综合项目。
+        提供timings字典时累加 parse、code_extraction、exercise_extraction 三个阶段的耗时。
+        """
+        clock = time.perf_counter
+        started = clock()
+        markers = DocumentMarkers(content)
+        info = self.parse_chapter_info(filename, content, markers)
+        parsed = clock()
+        sections = self.build_sections(content, markers)
+        extracted = clock()
+        exercises = self.build_exercises(content, markers)
+        projects = self.build_projects(content, markers)
+        if timings is not None:
+            add_timing(timings, 'parse', parsed - started)
+            add_timing(timings, 'code_extraction', extracted - parsed)
+            add_timing(timings, 'exercise_extraction', clock() - extracted)
+        return {'info': info, 'sections': sections, 'exercises': exercises, 'projects': projects}
+        
+    def parse_chapter_info(self, filename: str, content: str, markers: DocumentMarkers = None) -> Dict:
         """解析章节信息"""
         # 从文件名提取章节号
         chapter_match = re.search(r'第(\d+)章-(.+)\.md', filename)
@@ -73,13 +405,16 @@ class MarkdownToNotebook:
         chapter_num = int(chapter_match.group(1))
         chapter_title = chapter_match.group(2)
         
-        # 提取学习目标
-        objectives_match = re.search(r'## 学习目标\n(.*?)(?=##|$)', content, re.DOTALL)
+        # 提取学习目标：第一个“## 学习目标”之后到下一个 ## 为止
+        markers = markers or DocumentMarkers(content)
         objectives = []
-        if objectives_match:
-            objectives = [obj.strip('- ').strip() 
-                         for obj in objectives_match.group(1).split('\n') 
-                         if obj.strip().startswith('-')]
+        for _, end in markers.runs:
+            if content.startswith('## 学习目标\n', end - 2):
+                body_start = end - 2 + len('## 学习目标\n')
+                objectives = [obj.strip('- ').strip() 
+                             for obj in content[body_start:markers.next_hashes(body_start)].split('\n') 
+                             if obj.strip().startswith('-')]
+                break
         
         return {
             'number': chapter_num,
@@ -88,213 +423,258 @@ class MarkdownToNotebook:
             'objectives': objectives
         }
         
-    def create_content_notebook(self, content: str, chapter_info: Dict, output_dir: Path):
+    def create_content_notebook(self, document: Dict, output, chapter_dir: str) -> str:
         """创建主要内容的notebook"""
-        nb = new_notebook()
-        
-        # 添加标题
-        title_cell = new_markdown_cell(source=f"# 第{chapter_info['number']}章 {chapter_info['title']}")
-        nb.cells.append(title_cell)
-        
-        # 添加学习目标
-        if chapter_info['objectives']:
-            objectives_text = "## 学习目标\n\n" + "\n".join([f"- {obj}" for obj in chapter_info['objectives']])
-            nb.cells.append(new_markdown_cell(source=objectives_text))
-        
-        # 分析内容结构
-        sections = self.split_content_by_sections(content)
-        
-        for section in sections:
-            # 添加markdown内容
-            if section['markdown']:
-                nb.cells.append(new_markdown_cell(source=section['markdown']))
+        chapter_info = document['info']
+        output_file = f"{chapter_dir}/{chapter_info['number']:02d}-content.ipynb"
+        with output.open(output_file) as f:
+            nb = NotebookWriter(f, self.validate)
+            
+            # 添加标题
+            nb.add_markdown(f"# 第{chapter_info['number']}章 {chapter_info['title']}")
             
-            # 添加代码示例
-            for code_block in section['code_blocks']:
-                # 添加说明文本
-                if code_block['description']:
-                    nb.cells.append(new_markdown_cell(source=f"**示例**: {code_block['description']}"))
+            # 添加学习目标
+            if chapter_info['objectives']:
+                objectives_text = "## 学习目标\n\n" + "\n".join([f"- {obj}" for obj in chapter_info['objectives']])
+                nb.add_markdown(objectives_text)
+            
+            for section in document['sections']:
+                # 添加markdown内容
+                if section['markdown']:
+                    nb.add_markdown(section['markdown'])
                 
-                # 添加代码单元格
-                code_cell = new_code_cell(source=code_block['code'])
-                nb.cells.append(code_cell)
-        
-        # 保存notebook
-        output_file = output_dir / f"{chapter_info['number']:02d}-content.ipynb"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            nbformat.write(nb, f)
+                # 添加代码示例
+                for code_block in section['code_blocks']:
+                    # 添加说明文本
+                    if code_block['description']:
+                        nb.add_markdown(f"**示例**: {code_block['description']}")
+                    
+                    # 添加代码单元格
+                    nb.add_code(code_block['code'])
+            
+            nb.finish()
+        return output_file
             
-    def create_exercises_notebook(self, content: str, chapter_info: Dict, output_dir: Path):
+    def create_exercises_notebook(self, document: Dict, output, chapter_dir: str) -> Optional[str]:
         """创建练习题notebook"""
-        exercises = self.extract_exercises(content)
+        chapter_info = document['info']
+        exercises = document['exercises']
         if not exercises:
-            return
-            
-        nb = new_notebook()
-        
-        # 添加标题
-        title_cell = new_markdown_cell(source=f"# 第{chapter_info['number']}章 练习题")
-        nb.cells.append(title_cell)
+            return None
         
-        for i, exercise in enumerate(exercises, 1):
-            # 练习题标题和描述
-            exercise_title = f"## 练习 {i}: {exercise['title']}"
-            exercise_desc = f"{exercise_title}\n\n{exercise['description']}"
-            nb.cells.append(new_markdown_cell(source=exercise_desc))
+        output_file = f"{chapter_dir}/{chapter_info['number']:02d}-exercises.ipynb"
+        with output.open(output_file) as f:
+            nb = NotebookWriter(f, self.validate)
             
-            # 学生答题区域
-            student_cell = new_code_cell(source=exercise['template'])
-            # 添加nbgrader标记
-            student_cell.metadata = {
-                "nbgrader": {
-                    "grade": False,
-                    "grade_id": f"exercise_{i}_answer",
-                    "locked": False,
-                    "schema_version": 3,
-                    "solution": True,
-                    "task": False
-                }
-            }
-            nb.cells.append(student_cell)
+            # 添加标题
+            nb.add_markdown(f"# 第{chapter_info['number']}章 练习题")
             
-            # 测试用例
-            if exercise['tests']:
-                test_cell = new_code_cell(source=exercise['tests'])
-                test_cell.metadata = {
+            for i, exercise in enumerate(exercises, 1):
+                # 练习题标题和描述
+                exercise_title = f"## 练习 {i}: {exercise['title']}"
+                exercise_desc = f"{exercise_title}\n\n{exercise['description']}"
+                nb.add_markdown(exercise_desc)
+                
+                # 学生答题区域，添加nbgrader标记
+                nb.add_code(exercise['template'], metadata={
                     "nbgrader": {
-                        "grade": True,
-                        "grade_id": f"exercise_{i}_test",
-                        "locked": True,
-                        "points": exercise['points'],
+                        "grade": False,
+                        "grade_id": f"exercise_{i}_answer",
+                        "locked": False,
                         "schema_version": 3,
-                        "solution": False,
+                        "solution": True,
                         "task": False
                     }
-                }
-                nb.cells.append(test_cell)
-        
-        # 保存notebook
-        output_file = output_dir / f"{chapter_info['number']:02d}-exercises.ipynb"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            nbformat.write(nb, f)
+                })
+                
+                # 测试用例
+                if exercise['tests']:
+                    nb.add_code(exercise['tests'], metadata={
+                        "nbgrader": {
+                            "grade": True,
+                            "grade_id": f"exercise_{i}_test",
+                            "locked": True,
+                            "points": exercise['points'],
+                            "schema_version": 3,
+                            "solution": False,
+                            "task": False
+                        }
+                    })
+            
+            nb.finish()
+        return output_file
             
-    def create_project_notebook(self, content: str, chapter_info: Dict, output_dir: Path):
+    def create_project_notebook(self, document: Dict, output, chapter_dir: str) -> Optional[str]:
         """创建综合项目notebook"""
-        projects = self.extract_projects(content)
+        chapter_info = document['info']
+        projects = document['projects']
         if not projects:
-            return
-            
-        nb = new_notebook()
-        
-        # 添加标题
-        title_cell = new_markdown_cell(source=f"# 第{chapter_info['number']}章 综合项目")
-        nb.cells.append(title_cell)
+            return None
         
-        for project in projects:
-            # 项目标题和描述
-            project_desc = f"## {project['title']}\n\n{project['description']}"
-            nb.cells.append(new_markdown_cell(source=project_desc))
+        output_file = f"{chapter_dir}/{chapter_info['number']:02d}-project.ipynb"
+        with output.open(output_file) as f:
+            nb = NotebookWriter(f, self.validate)
             
-            # 需求分析
-            if project['requirements']:
-                req_text = "### 需求分析\n\n" + "\n".join([f"- {req}" for req in project['requirements']])
-                nb.cells.append(new_markdown_cell(source=req_text))
+            # 添加标题
+            nb.add_markdown(f"# 第{chapter_info['number']}章 综合项目")
             
-            # 代码实现区域
-            impl_cell = new_code_cell(source=project['template'])
-            impl_cell.metadata = {
-                "nbgrader": {
-                    "grade": False,
-                    "grade_id": f"project_implementation",
-                    "locked": False,
-                    "schema_version": 3,
-                    "solution": True,
-                    "task": False
-                }
-            }
-            nb.cells.append(impl_cell)
-            
-            # 测试区域
-            if project['tests']:
-                test_cell = new_code_cell(source=project['tests'])
-                test_cell.metadata = {
+            for project in projects:
+                # 项目标题和描述
+                project_desc = f"## {project['title']}\n\n{project['description']}"
+                nb.add_markdown(project_desc)
+                
+                # 需求分析
+                if project['requirements']:
+                    req_text = "### 需求分析\n\n" + "\n".join([f"- {req}" for req in project['requirements']])
+                    nb.add_markdown(req_text)
+                
+                # 代码实现区域
+                nb.add_code(project['template'], metadata={
                     "nbgrader": {
-                        "grade": True,
-                        "grade_id": f"project_test",
-                        "locked": True,
-                        "points": project['points'],
+                        "grade": False,
+                        "grade_id": f"project_implementation",
+                        "locked": False,
                         "schema_version": 3,
-                        "solution": False,
+                        "solution": True,
                         "task": False
                     }
-                }
-                nb.cells.append(test_cell)
-        
-        # 保存notebook
-        output_file = output_dir / f"{chapter_info['number']:02d}-project.ipynb"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            nbformat.write(nb, f)
+                })
+                
+                # 测试区域
+                if project['tests']:
+                    nb.add_code(project['tests'], metadata={
+                        "nbgrader": {
+                            "grade": True,
+                            "grade_id": f"project_test",
+                            "locked": True,
+                            "points": project['points'],
+                            "schema_version": 3,
+                            "solution": False,
+                            "task": False
+                        }
+                    })
+            
+            nb.finish()
+        return output_file
             
     def split_content_by_sections(self, content: str) -> List[Dict]:
         """按章节分割内容"""
+        return self.build_sections(content, DocumentMarkers(content))
+    
+    def build_sections(self, content: str, markers: DocumentMarkers) -> List[Dict]:
+        """按二级标题划分小节
+        
+        每个二级标题的范围只扫描一次，依次取出文字片段和代码片段，
+        直接拼接文字片段，不再为每个代码块调用一次replace。
+        """
         sections = []
         
         # 按二级标题分割
-        section_pattern = re.compile(r'^## (.+)$', re.MULTILINE)
-        section_matches = list(section_pattern.finditer(content))
+        headings = markers.headings()
         
-        for i, match in enumerate(section_matches):
-            start_pos = match.start()
-            end_pos = section_matches[i + 1].start() if i + 1 < len(section_matches) else len(content)
-            
-            section_content = content[start_pos:end_pos]
-            section_title = match.group(1)
+        for i, (start_pos, title) in enumerate(headings):
+            end_pos = headings[i + 1][0] if i + 1 < len(headings) else len(content)
             
-            # 提取代码块
-            code_blocks = self.extract_code_blocks(section_content)
+            segments = list(self.iter_segments(content, start_pos, end_pos, markers))
+            code_spans = [(start, end) for kind, start, end in segments if kind == 'code']
+            code_blocks = [self.make_code_block(content, start_pos, start, end) for start, end in code_spans]
             
-            # 移除代码块后的markdown内容
-            markdown_content = section_content
-            for code_block in code_blocks:
-                markdown_content = markdown_content.replace(f"```python\n{code_block['code']}\n```", "")
+            # 每个 ```python 都是代码块的开头、且代码块都从行首开始时，拼接文字片段与逐个replace的结果相同；
+            # 格式异常的部分仍按原来的方式逐个replace，保证生成的notebook不变
+            regular = (len(markers.openers_between(start_pos, end_pos)) == len(code_spans)
+                       and all(content[start - 1] == '\n' for start, _ in code_spans))
+            if regular:
+                markdown_parts = []
+                blocks = iter(code_blocks)
+                for kind, start, end in segments:
+                    # 代码首尾有空白时，按strip后的代码拼出的代码块与原文对不上，保留在文字中
+                    if kind == 'markdown' or content[start + CODE_FENCE_OPEN:end - CODE_FENCE_CLOSE] != next(blocks)['code']:
+                        markdown_parts.append(content[start:end])
+                markdown_content = ''.join(markdown_parts)
+            else:
+                markdown_content = content[start_pos:end_pos]
+                for code_block in code_blocks:
+                    markdown_content = markdown_content.replace(f"```python\n{code_block['code']}\n```", "")
             
             sections.append({
-                'title': section_title,
+                'title': title,
                 'markdown': markdown_content.strip(),
                 'code_blocks': code_blocks
             })
         
         return sections
+    
+    def iter_segments(self, content: str, start: int = 0, end: int = None, markers: DocumentMarkers = None):
+        """按顺序产出 content[start:end] 中的 ('markdown', 起, 止) 和 ('code', 起, 止) 片段
+        
+        代码片段从 ```python 开始，到其后第一个换行加 ``` 为止，偏移都相对于整个content。
+        """
+        end = len(content) if end is None else end
+        markers = markers or DocumentMarkers(content)
+        position = start
+        for opener in markers.openers_between(start, end):
+            if opener < position:  # 位于上一个代码块之内
+                continue
+            close = content.find('\n```', opener + CODE_FENCE_OPEN, end)
+            if close < 0:
+                break
+            if opener > position:
+                yield 'markdown', position, opener
+            position = close + CODE_FENCE_CLOSE
+            yield 'code', opener, position
+        if position < end:
+            yield 'markdown', position, end
+    
+    def make_code_block(self, content: str, section_start: int, start: int, end: int) -> Dict:
+        """根据代码片段的位置生成代码块，说明取自代码块之前倒数第三行"""
+        # 等价于 content[section_start:start].split('\n')[-3:][0]，只向前查找两个换行
+        last = content.rfind('\n', section_start, start)
+        if last < 0:
+            line = content[section_start:start]
+        else:
+            second = content.rfind('\n', section_start, last)
+            if second < 0:
+                line = content[section_start:last]
+            else:
+                line = content[content.rfind('\n', section_start, second) + 1 or section_start:second]
+        
+        description = ""
+        desc_match = self.description_pattern.search(line)
+        if desc_match:
+            description = desc_match.group(1).strip()
+        
+        return {
+            'code': content[start + CODE_FENCE_OPEN:end - CODE_FENCE_CLOSE].strip(),
+            'description': description
+        }
         
     def extract_code_blocks(self, content: str) -> List[Dict]:
         """提取代码块"""
-        code_blocks = []
-        
-        for match in self.code_pattern.finditer(content):
-            code = match.group(1).strip()
-            
-            # 查找代码块前的描述
-            description = ""
-            before_code = content[:match.start()]
-            desc_match = re.search(r'(?:示例|例子|代码)[:：]?\s*(.+?)(?=\n|$)', before_code.split('\n')[-3:][0] if before_code.split('\n') else "")
-            if desc_match:
-                description = desc_match.group(1).strip()
-            
-            code_blocks.append({
-                'code': code,
-                'description': description
-            })
-        
-        return code_blocks
+        return [self.make_code_block(content, 0, start, end)
+                for kind, start, end in self.iter_segments(content) if kind == 'code']
         
     def extract_exercises(self, content: str) -> List[Dict]:
         """提取练习题"""
+        return self.build_exercises(content, DocumentMarkers(content))
+    
+    def build_exercises(self, content: str, markers: DocumentMarkers) -> List[Dict]:
+        """提取“### 练习N：标题”形式的练习题，正文到下一个 ### 为止"""
         exercises = []
+        resume = 0
         
-        for match in self.exercise_pattern.finditer(content):
+        for _, end in markers.long_runs:
+            # “### 练习”只会出现在一串 # 的最后三个上
+            position = end - 3
+            if position < resume or not content.startswith('### 练习', position):
+                continue
+            match = self.exercise_pattern.match(content, position)
+            if not match:
+                continue
+            resume = markers.next_hashes(match.end(), 3)
+            
             exercise_num = match.group(1)
             exercise_title = match.group(2).strip()
-            exercise_content = match.group(3).strip()
+            exercise_content = content[match.end():resume].strip()
             
             # 解析练习题内容
             exercise_info = self.parse_exercise_content(exercise_content)
@@ -373,11 +753,24 @@ except Exception as e:
         
     def extract_projects(self, content: str) -> List[Dict]:
         """提取综合项目"""
+        return self.build_projects(content, DocumentMarkers(content))
+    
+    def build_projects(self, content: str, markers: DocumentMarkers) -> List[Dict]:
+        """提取“## 综合项目：标题”形式的项目，正文到下一个 ## 为止"""
         projects = []
+        resume = 0
         
-        for match in self.project_pattern.finditer(content):
+        for _, end in markers.runs:
+            position = end - 2
+            if position < resume or not content.startswith('## 综合项目', position):
+                continue
+            match = self.project_pattern.match(content, position)
+            if not match:
+                continue
+            resume = markers.next_hashes(match.end())
+            
             project_title = match.group(1).strip()
-            project_content = match.group(2).strip()
+            project_content = content[match.end():resume].strip()
             
             # 解析项目内容
             project_info = self.parse_project_content(project_content)
@@ -404,7 +797,7 @@ except Exception as e:
             'points': 20  # 项目分值更高
         }
         
-    def create_nbgrader_config(self, chapter_info: Dict, output_dir: Path):
+    def create_nbgrader_config(self, chapter_info: Dict, output, chapter_dir: str) -> str:
         """创建nbgrader配置文件"""
         config = {
             'course_id': 'python-fundamentals',
@@ -414,24 +807,68 @@ except Exception as e:
             'due_date': '2025-02-08 23:59:59'
         }
         
-        config_file = output_dir / 'nbgrader_config.yaml'
-        with open(config_file, 'w', encoding='utf-8') as f:
+        config_file = f"{chapter_dir}/nbgrader_config.yaml"
+        with output.open(config_file) as f:
             yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+        return config_file
+
+
+# 并行转换时每个工作进程持有一个转换器
+_worker_converter = None
+
+
+def _init_worker(source_dir: str, output_dir: str, validate: bool):
+    global _worker_converter
+    _worker_converter = MarkdownToNotebook(source_dir, output_dir, validate)
+
+
+def _convert_in_worker(chapter_file: str) -> Tuple[List[str], Optional[str]]:
+    return _convert_chapter_safely(_worker_converter, Path(chapter_file))
+
+
+def _convert_chapter_safely(converter: MarkdownToNotebook, chapter_file: Path,
+                            output=None) -> Tuple[List[str], Optional[str]]:
+    """转换一个章节，出错时返回错误信息而不是抛出异常"""
+    try:
+        return converter.convert_chapter(chapter_file, output=output), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
 
 
 def main():
     """主函数"""
     import os
+    import argparse
     
-    source_dir = os.environ.get('SOURCE_DIR', './source')
-    output_dir = os.environ.get('OUTPUT_DIR', './output')
-    
-    print(f"开始转换: {source_dir} -> {output_dir}")
+    parser = argparse.ArgumentParser(description='把教程Markdown转换为Jupyter Notebook')
+    parser.add_argument('--source', default=os.environ.get('SOURCE_DIR', './source'), help='Markdown章节目录')
+    parser.add_argument('--output', default=os.environ.get('OUTPUT_DIR', './output'), help='输出目录')
+    parser.add_argument('--force', action='store_true', help='忽略构建清单，全部重新转换')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='并行转换的进程数，0表示使用全部CPU核心')
+    parser.add_argument('--archive', help='把全部章节写入一个zip压缩包，而不是输出目录')
+    parser.add_argument('--no-validate', action='store_true', help='不按nbformat的schema校验生成的单元格')
+    args = parser.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
     
-    converter = MarkdownToNotebook(source_dir, output_dir)
-    converter.convert_all_chapters()
+    converter = MarkdownToNotebook(args.source, None if args.archive else args.output,
+                                   validate=not args.no_validate)
+    if args.archive:
+        print(f"开始转换: {args.source} -> {args.archive}")
+        with ZipOutput(args.archive) as output:
+            summary = converter.export_all(output)
+        print(f"转换完成！{len(summary['built'])} 章，共 {len(summary['files'])} 个文件")
+    else:
+        print(f"开始转换: {args.source} -> {args.output}")
+        summary = converter.convert_all_chapters(force=args.force, jobs=jobs)
+        print(f"转换完成！重新生成 {len(summary['built'])} 章，"
+              f"跳过未修改的 {len(summary['skipped'])} 章，清理 {len(summary['removed'])} 个旧文件")
     
-    print("转换完成！")
+    if summary['failed']:
+        print(f"\n{len(summary['failed'])} 个章节转换失败：")
+        for failure in summary['failed']:
+            print(f"  {failure['chapter']}: {failure['error']}")
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
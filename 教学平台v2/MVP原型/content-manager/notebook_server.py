@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+按需生成Notebook的服务
+
+功能:
+1. GET /notebooks/<章节号>/<类型>.ipynb 返回章节的内容(content)、练习题(exercises)或综合项目(project)notebook
+2. 某一章第一次被请求时才转换，三个notebook一起生成并按源文件哈希缓存，源文件修改后自动重新生成
+3. 同一章节同时到达的多个请求只转换一次，其余请求等待同一个结果
+4. 新增的章节放入源目录后即可访问，不需要重新批量构建
+
+命令行用法:
+    python notebook_server.py --source ./source --port 8001
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from flask import Flask, Response, jsonify, request
+
+from md_to_notebook import MarkdownToNotebook, MemoryOutput
+
+KINDS = ('content', 'exercises', 'project')
+CHAPTER_PATTERN = re.compile(r'第(\d+)章-.+\.md$')
+
+
+class NotebookService:
+    """按章节生成notebook并缓存，同一章节的并发请求合并为一次转换"""
+
+    def __init__(self, source_dir: str, validate: bool = True):
+        self.source_dir = Path(source_dir)
+        self.converter = MarkdownToNotebook(source_dir, None, validate)
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}  # 文件名 -> (修改时间, 大小, 哈希)
+        self._cache: Dict[str, Tuple[str, Dict[str, str]]] = {}  # 文件名 -> (哈希, {类型: notebook})
+        self._building: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.coalesced = 0
+
+    def find_chapter(self, number: int) -> Optional[Path]:
+        """在源目录中查找章节文件；每次都重新列目录，新增的章节立即可用"""
+        for entry in os.scandir(self.source_dir):
+            match = CHAPTER_PATTERN.match(entry.name)
+            if match and int(match.group(1)) == number:
+                return Path(entry.path)
+        return None
+
+    def _source(self, chapter_file: Path) -> Tuple[str, Optional[str]]:
+        """返回源文件哈希；修改时间和大小都没变时沿用上次的哈希，不读文件，此时内容为None"""
+        stat = chapter_file.stat()
+        known = self._hashes.get(chapter_file.name)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2], None
+        data = chapter_file.read_bytes()
+        source_hash = hashlib.sha256(data).hexdigest()
+        self._hashes[chapter_file.name] = (stat.st_mtime_ns, stat.st_size, source_hash)
+        return source_hash, data.decode('utf-8')
+
+    def get(self, number: int, kind: str) -> Optional[Tuple[str, str]]:
+        """返回 (notebook内容, 源文件哈希)，章节不存在或没有该类型的notebook时返回None"""
+        chapter_file = self.find_chapter(number)
+        if chapter_file is None:
+            return None
+        source_hash, content = self._source(chapter_file)
+        notebook = self._notebooks(chapter_file, source_hash, content).get(kind)
+        return (notebook, source_hash) if notebook is not None else None
+
+    def _notebooks(self, chapter_file: Path, source_hash: str, content: Optional[str]) -> Dict[str, str]:
+        """取缓存中的notebook；没有时由第一个请求转换，同时到达的请求等待它的结果"""
+        key = (chapter_file.name, source_hash)
+        with self._lock:
+            cached = self._cache.get(chapter_file.name)
+            if cached is not None and cached[0] == source_hash:
+                self.hits += 1
+                return cached[1]
+            future = self._building.get(key)
+            owner = future is None
+            if owner:
+                future = self._building[key] = Future()
+                self.builds += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        notebooks = None
+        try:
+            notebooks = self._build(chapter_file, content)
+        except Exception as e:
+            # 转换失败不缓存，下一个请求会重新尝试；等待者收到同一个异常
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if notebooks is not None:
+                    self._cache[chapter_file.name] = (source_hash, notebooks)
+                del self._building[key]
+            if notebooks is not None:
+                future.set_result(notebooks)
+            elif not future.done():
+                # 被KeyboardInterrupt、SystemExit等中断时取消，等待者收到CancelledError而不是一直挂起
+                future.cancel()
+        return notebooks
+
+    def _build(self, chapter_file: Path, content: Optional[str]) -> Dict[str, str]:
+        """在内存中转换一章，返回 {类型: notebook}"""
+        output = MemoryOutput()
+        self.converter.convert_chapter(chapter_file, content, output)
+        return {Path(name).stem.split('-', 1)[1]: text
+                for name, text in output.files.items() if name.endswith('.ipynb')}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'chapters': len(self._cache),
+                'building': len(self._building),
+                'hits': self.hits,
+                'builds': self.builds,
+                'coalesced': self.coalesced
+            }
+
+
+def create_app(service: NotebookService) -> Flask:
+    """创建提供notebook下载的Flask应用"""
+    app = Flask(__name__)
+
+    @app.route('/notebooks/<int:chapter>/<kind>.ipynb')
+    def get_notebook(chapter, kind):
+        """获取章节的notebook"""
+        if kind not in KINDS:
+            return jsonify({'success': False, 'error': f'未知的notebook类型: {kind}'}), 404
+        try:
+            result = service.get(chapter, kind)
+        except Exception as e:
+            return jsonify({'success': False, 'error': f'生成notebook失败: {str(e)}'}), 500
+        if result is None:
+            return jsonify({'success': False, 'error': f'第{chapter}章没有{kind} notebook'}), 404
+
+        notebook, source_hash = result
+        etag = f'{source_hash[:16]}-{kind}'
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        return Response(notebook, mimetype='application/x-ipynb+json', headers=headers)
+
+    @app.route('/notebooks/stats')
+    def notebook_stats():
+        """缓存统计"""
+        return jsonify({'success': True, 'stats': service.stats()})
+
+    return app
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='按需把教程Markdown转换为Jupyter Notebook的服务')
+    parser.add_argument('--source', default=os.environ.get('SOURCE_DIR', './source'), help='Markdown章节目录')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--no-validate', action='store_true', help='不按nbformat的schema校验生成的单元格')
+    args = parser.parse_args()
+
+    service = NotebookService(args.source, validate=not args.no_validate)
+    print(f"Notebook服务启动: {args.source} -> http://{args.host}:{args.port}/notebooks/<章节号>/<类型>.ipynb")
+    create_app(service).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
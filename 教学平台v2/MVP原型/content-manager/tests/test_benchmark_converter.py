@@ -0,0 +1,40 @@
+"""转换器各阶段计时和性能测试脚本"""
+
+from pathlib import Path
+
+import pytest
+
+from benchmark_converter import STAGES, convert, run_corpus
+from md_to_notebook import MarkdownToNotebook, MemoryOutput
+
+CHAPTER = ('第1章-测试.md', '# 第1章 测试\n\n## 学习目标\n- 目标\n\n## 内容\n\n示例：打印\n```python\nprint(1)\n```\n\n'
+           '### 练习1：题目\n\n**要求**\n输入 输出\n\n## 综合项目：项目\n说明\n')
+
+
+def test_convert_chapter_accumulates_stage_timings():
+    converter = MarkdownToNotebook('.', None)
+    timings = {}
+    output = MemoryOutput()
+    names = converter.convert_chapter(Path(CHAPTER[0]), CHAPTER[1], output, timings)
+    assert set(timings) == {'parse', 'code_extraction', 'exercise_extraction', 'notebook_build'}
+    assert all(seconds >= 0 for seconds in timings.values())
+    first = dict(timings)
+    assert converter.convert_chapter(Path(CHAPTER[0]), CHAPTER[1], output, timings) == names
+    assert all(timings[stage] >= first[stage] for stage in first)
+
+
+def test_benchmark_times_the_real_conversion(tmp_path):
+    result = convert(MarkdownToNotebook('.', None), [CHAPTER], tmp_path)
+    assert set(result['timings']) == set(STAGES)
+    assert result['timings']['write'] > 0
+    assert result['notebooks'] == 3
+    assert result['files'] == 4
+    assert (tmp_path / 'chapter-01' / '01-project.ipynb').exists()
+
+
+def test_run_corpus_requires_a_repeat():
+    with pytest.raises(ValueError):
+        run_corpus('books', [CHAPTER], True, 0)
+    corpus = run_corpus('books', [CHAPTER], False, 1)
+    assert corpus['notebooks'] == 3
+    assert set(corpus['stages_ms']) == set(STAGES)
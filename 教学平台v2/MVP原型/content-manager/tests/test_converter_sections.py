@@ -0,0 +1,88 @@
+"""小节划分和代码块提取与原来逐个replace的实现保持一致"""
+
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+from md_to_notebook import MarkdownToNotebook
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+BOOK_CHAPTERS = sorted(REPO_ROOT.glob('第*册-*/第*章-*.md'))
+
+CODE_PATTERN = re.compile(r'```python\n(.*?)\n```', re.DOTALL)
+SECTION_PATTERN = re.compile(r'^## (.+)$', re.MULTILINE)
+
+
+def reference_code_blocks(content):
+    """原来的实现：正则匹配代码块，说明取自代码块之前倒数第三行"""
+    code_blocks = []
+    for match in CODE_PATTERN.finditer(content):
+        lines = content[:match.start()].split('\n')
+        description = ""
+        desc_match = re.search(r'(?:示例|例子|代码)[:：]?\s*(.+?)(?=\n|$)', lines[-3:][0] if lines else "")
+        if desc_match:
+            description = desc_match.group(1).strip()
+        code_blocks.append({'code': match.group(1).strip(), 'description': description})
+    return code_blocks
+
+
+def reference_sections(content):
+    """原来的实现：按二级标题切分，对每个代码块调用一次replace去掉代码"""
+    sections = []
+    matches = list(SECTION_PATTERN.finditer(content))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        section_content = content[match.start():end]
+        code_blocks = reference_code_blocks(section_content)
+        markdown_content = section_content
+        for code_block in code_blocks:
+            markdown_content = markdown_content.replace(f"```python\n{code_block['code']}\n```", "")
+        sections.append({'title': match.group(1), 'markdown': markdown_content.strip(), 'code_blocks': code_blocks})
+    return sections
+
+
+EDGE_CASES = [
+    "intro\n```python\nx=1\n```\n## A\n示例：打印\n\n```python\nprint(1)\n```\n## B\n```python\n\n  y=2  \n\n```\n"
+    "text 代码: zz\n```python\nprint(1)\n```\n```python\nprint(1)\n```",
+    "## only\n```python\na\n```python\nb\n```\n```python\n```\n```python\n\n```",
+    "## x\n代码：abc\n```python\nq\n```",
+    "## x\n代码：abc\n\n\n\n```python\nq\n```",
+    "## s\n例子 first\nsecond\n```python\nq\n```\n## t\n```python\n# ## not a header\n```\n## u",
+    "## 未闭合\n```python\nprint(1)\n",
+    "## 行内\n文字```python\nx\n```\n",
+]
+
+PIECES = ['## 标题\n', '示例：演示\n', '\n', 'text\n', '```python\n', 'print(1)\n', '```\n', '  \n',
+          '代码 x\n', '```\n', '```python\n\n', '文字```python\n']
+
+
+def random_documents(count, seed):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(PIECES) for _ in range(rng.randint(1, 30))) for _ in range(count)]
+
+
+@pytest.fixture(scope='module')
+def converter():
+    return MarkdownToNotebook('.', None)
+
+
+@pytest.mark.parametrize('content', EDGE_CASES)
+def test_edge_cases_match_reference(converter, content):
+    assert converter.split_content_by_sections(content) == reference_sections(content)
+    assert converter.extract_code_blocks(content) == reference_code_blocks(content)
+
+
+def test_random_documents_match_reference(converter):
+    for content in random_documents(2000, seed=1):
+        assert converter.split_content_by_sections(content) == reference_sections(content), content
+        assert converter.extract_code_blocks(content) == reference_code_blocks(content), content
+
+
+@pytest.mark.skipif(not BOOK_CHAPTERS, reason='没有找到教材章节')
+@pytest.mark.parametrize('path', BOOK_CHAPTERS, ids=lambda path: path.name)
+def test_book_chapters_match_reference(converter, path):
+    content = path.read_text(encoding='utf-8')
+    assert converter.split_content_by_sections(content) == reference_sections(content)
+    assert converter.extract_code_blocks(content) == reference_code_blocks(content)
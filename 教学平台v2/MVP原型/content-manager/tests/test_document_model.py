@@ -0,0 +1,118 @@
+"""文档模型（一次扫描）提取的练习题、项目和学习目标与原来的正则实现保持一致"""
+
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+from md_to_notebook import DocumentMarkers, MarkdownToNotebook
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+BOOK_CHAPTERS = sorted(REPO_ROOT.glob('第*册-*/第*章-*.md'))
+
+EXERCISE_PATTERN = re.compile(r'### 练习题?\s*(\d+)[:：]\s*(.*?)\n(.*?)(?=###|$)', re.DOTALL)
+PROJECT_PATTERN = re.compile(r'## 综合项目[:：]\s*(.*?)\n(.*?)(?=##|$)', re.DOTALL)
+OBJECTIVES_PATTERN = re.compile(r'## 学习目标\n(.*?)(?=##|$)', re.DOTALL)
+
+
+def reference_exercises(converter, content):
+    exercises = []
+    for match in EXERCISE_PATTERN.finditer(content):
+        info = converter.parse_exercise_content(match.group(3).strip())
+        exercises.append({
+            'number': match.group(1),
+            'title': match.group(2).strip(),
+            'description': info['description'],
+            'template': info['template'],
+            'tests': info['tests'],
+            'points': info['points']
+        })
+    return exercises
+
+
+def reference_projects(converter, content):
+    projects = []
+    for match in PROJECT_PATTERN.finditer(content):
+        info = converter.parse_project_content(match.group(2).strip())
+        projects.append({
+            'title': match.group(1).strip(),
+            'description': info['description'],
+            'requirements': info['requirements'],
+            'template': info['template'],
+            'tests': info['tests'],
+            'points': info['points']
+        })
+    return projects
+
+
+def reference_objectives(content):
+    match = OBJECTIVES_PATTERN.search(content)
+    if not match:
+        return []
+    return [obj.strip('- ').strip() for obj in match.group(1).split('\n') if obj.strip().startswith('-')]
+
+
+EDGE_CASES = [
+    "## 学习目标\n- a\n- b\n",
+    "## 学习目标\n- a\n### 子标题\n- b\n",
+    "### 练习1：t\n\n",
+    "### 练习1：\n\nx\n### 练习2:y",
+    "### 练习题 3： 标题\n**要求**\n输入 输出\n```python\nx\n```\n#### 其他",
+    "## 综合项目：p\nbody\n",
+    "x## 综合项目：p\n",
+    "#### 练习3：q\nbody\n##### x",
+    "## 综合项目：a\n" + "长" * 300 + "\n## 综合项目：b",
+]
+
+PIECES = ['## 标题\n', '## 学习目标\n', '- 目标\n', '### 练习1：做题\n', '### 练习题 2: x\n', '#### 练习3：\n',
+          '### 练习x：\n', '## 综合项目：项目\n', '## 综合项目:\n', '###\n', '##', '#', '示例：演示\n', '\n',
+          'text\n', '```python\n', 'print(1)\n', '```\n', '  \n', '代码 x\n', '**要求**\n', '输入 输出\n',
+          '```python\n\n', ' ', '## ']
+
+
+def random_documents(count, seed):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(PIECES) for _ in range(rng.randint(1, 30))) for _ in range(count)]
+
+
+@pytest.fixture(scope='module')
+def converter():
+    return MarkdownToNotebook('.', None)
+
+
+def check(converter, content):
+    document = converter.parse_chapter('第1章-测试.md', content)
+    assert document['exercises'] == reference_exercises(converter, content), content
+    assert document['projects'] == reference_projects(converter, content), content
+    assert document['info']['objectives'] == reference_objectives(content), content
+    assert converter.extract_exercises(content) == document['exercises']
+    assert converter.extract_projects(content) == document['projects']
+
+
+@pytest.mark.parametrize('content', EDGE_CASES)
+def test_edge_cases_match_reference(converter, content):
+    check(converter, content)
+
+
+def test_random_documents_match_reference(converter):
+    for content in random_documents(3000, seed=2):
+        check(converter, content)
+
+
+@pytest.mark.skipif(not BOOK_CHAPTERS, reason='没有找到教材章节')
+@pytest.mark.parametrize('path', BOOK_CHAPTERS, ids=lambda path: path.name)
+def test_book_chapters_match_reference(converter, path):
+    check(converter, path.read_text(encoding='utf-8'))
+
+
+def test_next_hashes_matches_lookahead():
+    """next_hashes(p, w) 与 (?=#{w}|$) 找到的位置相同"""
+    rng = random.Random(3)
+    for _ in range(500):
+        content = ''.join(rng.choice(['#', '##', '###', 'a', '\n', ' ']) for _ in range(rng.randint(0, 40)))
+        markers = DocumentMarkers(content)
+        for position in range(len(content) + 1):
+            for width in (2, 3):
+                expected = re.compile('(?=#{%d}|$)' % width).search(content, position).start()
+                assert markers.next_hashes(position, width) == expected, (content, position, width)
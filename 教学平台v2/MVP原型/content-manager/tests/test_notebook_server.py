@@ -0,0 +1,92 @@
+"""按需生成notebook的服务：同一章节的并发请求合并为一次转换"""
+
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from notebook_server import NotebookService
+
+CHAPTER = """# 第1章 测试
+
+## 1.1 变量
+
+```python
+x = 1
+print(x)
+```
+"""
+
+
+class Interrupted(BaseException):
+    """模拟KeyboardInterrupt、SystemExit等不是Exception的异常"""
+
+
+@pytest.fixture
+def service(tmp_path):
+    (tmp_path / '第1章-测试.md').write_text(CHAPTER, encoding='utf-8')
+    return NotebookService(str(tmp_path), validate=False)
+
+
+def coalesce(service, build):
+    """让第一个请求在转换中途等待，第二个请求到达后再由build决定结果，返回两个请求的结果"""
+    started = threading.Event()
+    waiting = threading.Event()
+    real_build = service._build
+
+    def slow_build(chapter_file, content):
+        started.set()
+        waiting.wait(5)
+        return build(real_build, chapter_file, content)
+
+    service._build = slow_build
+    results = {}
+
+    def request(name):
+        try:
+            results[name] = service.get(1, 'content')
+        except BaseException as e:
+            results[name] = e
+
+    owner = threading.Thread(target=request, args=('owner',), daemon=True)
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=request, args=('waiter',), daemon=True)
+    waiter.start()
+    while service.stats()['coalesced'] == 0 and waiter.is_alive():
+        waiter.join(0.01)
+    waiting.set()
+    owner.join(5)
+    waiter.join(5)
+    assert not owner.is_alive() and not waiter.is_alive()
+    del service._build
+    return results['owner'], results['waiter']
+
+
+def test_concurrent_requests_share_one_build(service):
+    owner, waiter = coalesce(service, lambda build, *args: build(*args))
+    assert owner == waiter
+    assert service.stats()['builds'] == 1
+    assert service.stats()['coalesced'] == 1
+
+
+def test_waiters_get_the_build_error(service):
+    def fail(build, *args):
+        raise ValueError('转换失败')
+
+    owner, waiter = coalesce(service, fail)
+    assert isinstance(owner, ValueError)
+    assert waiter is owner
+    assert service.stats()['building'] == 0
+
+
+def test_waiters_do_not_hang_when_build_is_interrupted(service):
+    def interrupt(build, *args):
+        raise Interrupted()
+
+    owner, waiter = coalesce(service, interrupt)
+    assert isinstance(owner, Interrupted)
+    assert isinstance(waiter, CancelledError)
+    assert service.stats()['building'] == 0
+    # 下一个请求重新转换
+    assert service.get(1, 'content') is not None
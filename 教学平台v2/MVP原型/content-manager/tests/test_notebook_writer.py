@@ -0,0 +1,115 @@
+"""NotebookWriter的输出与nbformat.writes相同，各输出目标生成的文件一致"""
+
+import io
+import random
+import re
+import zipfile
+from pathlib import Path
+
+import nbformat
+import pytest
+from nbformat.v4 import new_code_cell, new_markdown_cell, new_notebook
+
+from md_to_notebook import DirectoryOutput, MarkdownToNotebook, MemoryOutput, NotebookWriter, ZipOutput
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+BOOK_CHAPTERS = sorted(REPO_ROOT.glob('第*册-*/第*章-*.md'))
+
+CELL_ID = re.compile(r'"id": "[0-9a-f]{8}"')
+ALPHABET = ['a', 'Z', ' ', '\n', '\r', '\r\n', '\t', '"', '\\', '/', '中文', '😀', '\x00', '\x1f', ' ', '#', '```']
+NBGRADER = {'nbgrader': {'grade': True, 'grade_id': 'exercise_1_test', 'locked': True, 'points': 5,
+                         'schema_version': 3, 'solution': False, 'task': False}}
+
+
+def mask_ids(text):
+    return CELL_ID.sub('"id": "-"', text)
+
+
+def random_cells(rng):
+    cells = []
+    for _ in range(rng.randint(0, 6)):
+        source = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 20)))
+        if rng.random() < 0.5:
+            cells.append(('markdown', source, None))
+        else:
+            cells.append(('code', source, rng.choice([None, NBGRADER])))
+    return cells
+
+
+def write_streaming(cells, validate=True):
+    buffer = io.StringIO()
+    writer = NotebookWriter(buffer, validate)
+    for kind, source, metadata in cells:
+        if kind == 'markdown':
+            writer.add_markdown(source)
+        else:
+            writer.add_code(source, metadata)
+    writer.finish()
+    return buffer.getvalue()
+
+
+def write_nbformat(cells):
+    nb = new_notebook()
+    for kind, source, metadata in cells:
+        if kind == 'markdown':
+            nb.cells.append(new_markdown_cell(source=source))
+        else:
+            cell = new_code_cell(source=source)
+            if metadata is not None:
+                cell.metadata = metadata
+            nb.cells.append(cell)
+    buffer = io.StringIO()
+    nbformat.write(nb, buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('validate', [True, False])
+def test_matches_nbformat_write(validate):
+    rng = random.Random(4)
+    for _ in range(500):
+        cells = random_cells(rng)
+        assert mask_ids(write_streaming(cells, validate)) == mask_ids(write_nbformat(cells)), cells
+
+
+def test_output_is_a_valid_notebook():
+    text = write_streaming([('markdown', '# 标题\n正文', None), ('code', 'print(1)\n', NBGRADER), ('code', '', None)])
+    nbformat.validate(nbformat.reads(text, as_version=4))
+
+
+def test_validation_rejects_invalid_cells():
+    writer = NotebookWriter(io.StringIO())
+    with pytest.raises(nbformat.ValidationError):
+        writer.add_code('x', {'collapsed': 'yes'})
+
+
+@pytest.mark.skipif(not BOOK_CHAPTERS, reason='没有找到教材章节')
+def test_outputs_produce_same_files(tmp_path):
+    converter = MarkdownToNotebook('.', None)
+    chapters = BOOK_CHAPTERS[:3]
+
+    memory = MemoryOutput()
+    directory = DirectoryOutput(tmp_path / 'dir')
+    with ZipOutput(str(tmp_path / 'out.zip')) as archive:
+        for chapter in chapters:
+            names = converter.convert_chapter(chapter, output=memory)
+            assert converter.convert_chapter(chapter, output=directory) == names
+            assert converter.convert_chapter(chapter, output=archive) == names
+
+    with zipfile.ZipFile(tmp_path / 'out.zip') as archive:
+        assert set(archive.namelist()) == set(memory.files)
+        for name, text in memory.files.items():
+            assert mask_ids(archive.read(name).decode('utf-8')) == mask_ids(text)
+            assert mask_ids((tmp_path / 'dir' / name).read_text(encoding='utf-8')) == mask_ids(text)
+
+
+def test_stale_outputs_are_discarded(tmp_path):
+    chapter = tmp_path / '第1章-测试.md'
+    chapter.write_text('# 第1章 测试\n\n## 内容\n\n正文\n\n### 练习1：题目\n\n**要求**\n写代码\n', encoding='utf-8')
+    converter = MarkdownToNotebook(str(tmp_path), None)
+    memory = MemoryOutput()
+    assert 'chapter-01/01-exercises.ipynb' in converter.convert_chapter(chapter, output=memory)
+
+    chapter.write_text('# 第1章 测试\n\n## 内容\n\n正文\n', encoding='utf-8')
+    converter.convert_chapter(chapter, output=memory)
+    assert 'chapter-01/01-exercises.ipynb' not in memory.files
+    assert 'chapter-01/01-content.ipynb' in memory.files